@@ -0,0 +1,34 @@
+-- Denormalized copy of each artisan's skill ids on users, kept in sync by triggers.
+-- Lets the artisan listing's "has all of these skills" filter be a single GIN probe
+-- (skill_ids @> ARRAY[...]) instead of a join + GROUP BY + HAVING over artisan_skills.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS skill_ids INTEGER[] NOT NULL DEFAULT '{}';
+
+-- Backfill from the existing junction rows
+UPDATE users u
+SET skill_ids = ARRAY(SELECT a.skill_id FROM artisan_skills a WHERE a.artisan_id = u.id ORDER BY a.skill_id)
+WHERE EXISTS (SELECT 1 FROM artisan_skills a WHERE a.artisan_id = u.id);
+
+CREATE INDEX IF NOT EXISTS idx_users_skill_ids ON users USING gin (skill_ids);
+
+-- Statement-level triggers: a multi-row insert or delete (execute_values, the skills merge,
+-- a cascading skill delete) recomputes each affected artisan once, not once per row.
+CREATE OR REPLACE FUNCTION sync_user_skill_ids() RETURNS trigger AS $$
+BEGIN
+    UPDATE users u
+    SET skill_ids = ARRAY(SELECT a.skill_id FROM artisan_skills a WHERE a.artisan_id = u.id ORDER BY a.skill_id)
+    WHERE u.id IN (SELECT DISTINCT artisan_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_artisan_skills_insert_sync ON artisan_skills;
+CREATE TRIGGER trg_artisan_skills_insert_sync
+    AFTER INSERT ON artisan_skills
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_skill_ids();
+
+DROP TRIGGER IF EXISTS trg_artisan_skills_delete_sync ON artisan_skills;
+CREATE TRIGGER trg_artisan_skills_delete_sync
+    AFTER DELETE ON artisan_skills
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_skill_ids();
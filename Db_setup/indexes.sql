@@ -0,0 +1,46 @@
+-- Indexes backing the API's list/filter queries.
+-- CONCURRENTLY avoids locking writes on a live database. It cannot run inside a transaction
+-- block, so run this file statement by statement (e.g. psql -f indexes.sql without --single-transaction).
+
+-- Admin user listing: optional user_type filter, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created_at ON users (created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_type_created_at ON users (user_type, created_at DESC);
+
+-- Admin job listing: optional status / client / assigned artisan filters, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_created_at ON jobs (created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_status_created_at ON jobs (status, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_client_created_at ON jobs (client_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_assigned_artisan_created_at ON jobs (assigned_artisan_id, created_at DESC)
+    WHERE assigned_artisan_id IS NOT NULL; -- Unassigned jobs are never looked up by artisan
+-- Open jobs are the most requested status; a small partial index keeps that scan cheap
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_jobs_open_created_at ON jobs (created_at DESC) WHERE status = 'open';
+
+-- Artisan listing (GET /api/artisans): artisans only, newest first with id as the tie-breaker.
+-- artisan_skills (artisan_id, skill_id) and skills (name) are already covered by their
+-- primary key / unique constraint in init.sql.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_artisan_created_at ON users (created_at DESC, id DESC)
+    WHERE user_type = 'artisan';
+-- Skill filters go skill -> artisans, the reverse of the primary key's column order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_artisan_skills_skill_artisan ON artisan_skills (skill_id, artisan_id);
+
+-- Artisan listing location filter is a substring match (ILIKE '%...%'), which a btree can't serve
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_location_trgm ON users USING gin (location gin_trgm_ops);
+
+-- Reviews feed (GET /api/artisans/{id}/reviews): one artisan's reviews, newest first.
+-- The INCLUDE columns let Postgres answer the query from the index alone (Index Only Scan
+-- once the table has been vacuumed). Supersedes idx_job_reviews_artisan_id from revies.sql.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_job_reviews_artisan_created_at ON job_reviews (artisan_id, created_at DESC)
+    INCLUDE (id, job_id, client_id, rating, comment, updated_at);
+
+-- Login (WHERE email = ...) and the register duplicate check (email / phone_number probes) are
+-- served by the UNIQUE constraints' own indexes (users_email_key, users_phone_number_key).
+-- idx_users_email / idx_users_phone from init.sql duplicate them and only cost extra writes.
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_email;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_phone;
+
+-- The login lookup is a single-row fetch through users_email_key, so a covering index that
+-- copies the row (idx_users_email_login, password_hash included) saves nothing; drop it if present.
+-- artisan_skills (artisan_id, skill_id) and skills (name) need nothing extra: their primary
+-- key / unique constraint already cover the skills subquery and the name = ANY(...) lookups.
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_email_login;
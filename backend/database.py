@@ -1,35 +1,363 @@
+import collections
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.pool import ThreadedConnectionPool, PoolError
+import psycopg2.extensions
+from psycopg2.pool import PoolError
 import os
+import queue
+import re
 import sys
+import threading
+import time
 from fastapi import HTTPException # Make sure HTTPException is imported here!
 
 # Global variable to hold the connection pool
 db_pool = None
 
-def init_db_pool(min_conn: int = 1, max_conn: int = 10):
+# Default pool ceiling: the usual (cores * 2) + spindles sizing rule, never below the old fixed 10
+DEFAULT_MAX_CONNECTIONS = max(10, (os.cpu_count() or 1) * 2 + 4)
+
+# Session-level PREPAREd statements don't survive a transaction-mode pooler such as PgBouncer,
+# where consecutive statements may run on different server connections. Set
+# DB_PREPARED_STATEMENTS=false when DB_HOST/DB_PORT point at one; read in init_db_pool().
+prepared_statements_enabled = True
+
+# Longest a request waits for a pooled connection before failing with 503 instead of queueing
+# indefinitely behind a saturated pool. Seconds; DB_ACQUIRE_TIMEOUT, read in init_db_pool().
+DEFAULT_ACQUIRE_TIMEOUT = 2.0
+acquire_timeout = DEFAULT_ACQUIRE_TIMEOUT
+
+_PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+_plain_sql_cache = {} # name -> (sql with %s placeholders, parameter order)
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that remembers which statements it has PREPAREd.
+    Prepared statements live as long as the server session, so the set lives on the connection.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+def execute_prepared(cursor, name: str, sql: str, params=()):
+    """
+    Runs `sql` (written with $1, $2, ... placeholders) as the server-side prepared statement `name`.
+    The statement is parsed and planned once per connection; later calls only send EXECUTE.
+    `name` must be unique per distinct SQL text.
+    With prepared statements disabled the same SQL is sent as an ordinary parameterized query.
+    """
+    if not prepared_statements_enabled:
+        plain = _plain_sql_cache.get(name)
+        if plain is None:
+            order = [int(n) - 1 for n in _PLACEHOLDER_RE.findall(sql)]
+            plain = (_PLACEHOLDER_RE.sub("%s", sql.replace("%", "%%")), order)
+            _plain_sql_cache[name] = plain
+        cursor.execute(plain[0], [params[i] for i in plain[1]])
+        return
+
+    conn = cursor.connection
+    if name not in conn.prepared_statements:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared_statements.add(name)
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+class _Waiter:
+    """A getconn caller parked until putconn hands it a connection directly."""
+    __slots__ = ("event", "conn", "cancelled", "lock")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def offer(self, conn) -> bool:
+        """Hands `conn` to this waiter. Returns False if the waiter already gave up."""
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.conn = conn
+            self.event.set()
+            return True
+
+    def cancel(self) -> bool:
+        """Withdraws this waiter. Returns False if a connection was already handed over."""
+        with self.lock:
+            if self.event.is_set():
+                return False
+            self.cancelled = True
+            return True
+
+class LockFreePool:
+    """
+    Connection pool whose idle connections live in a `queue.SimpleQueue`.
+
+    psycopg2's ThreadedConnectionPool takes one global lock on every getconn/putconn.
+    Here the common path (an idle connection is available, or one is being returned)
+    never touches a Python-level lock: SimpleQueue.put/get_nowait are atomic C calls.
+    The only critical section is the size counter, taken when the pool has to grow.
+
+    When the pool is exhausted, callers queue up FIFO in `_waiters` and putconn gives
+    the returned connection straight to the oldest one instead of the idle list.
+
+    Idle connections are stored with the time they were returned. One that sat idle longer
+    than PING_AFTER gets a `SELECT 1` before being handed out, and is replaced if the server
+    dropped it (restart, idle timeout, network blip), so requests don't fail on stale sockets.
+    """
+
+    WAIT_SLICE = 0.05 # Seconds a waiter sleeps before re-checking the idle list and capacity
+    PING_AFTER = 30.0 # Seconds idle after which a connection is checked before reuse
+
+    def __init__(self, minconn: int, maxconn: int, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.closed = False
+        self._connect_kwargs = connect_kwargs
+        self._idle = queue.SimpleQueue()
+        self._waiters = collections.deque()
+        self._size = 0
+        self._size_lock = threading.Lock()
+        # Acquisition counters, reported by stats() so the pool size can be tuned from real numbers
+        self._stats_lock = threading.Lock()
+        self._requested = 0
+        self._acquired = 0
+        self._unacquired_error = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        for _ in range(minconn):
+            self._reserve_slot()
+            self._idle.put((self._open(), time.monotonic()))
+
+    def _reserve_slot(self) -> bool:
+        with self._size_lock:
+            if self._size >= self.maxconn:
+                return False
+            self._size += 1
+            return True
+
+    def _open(self):
+        """Opens a connection for a slot already reserved with _reserve_slot."""
+        try:
+            return psycopg2.connect(**self._connect_kwargs)
+        except Exception:
+            with self._size_lock:
+                self._size -= 1
+            raise
+
+    def _discard(self, conn):
+        if not conn.closed:
+            conn.close()
+        with self._size_lock:
+            self._size -= 1
+
+    def _take_idle(self):
+        """Pops idle connections until a usable one turns up; returns None if the idle list runs dry."""
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if not conn.closed and (time.monotonic() - idle_since < self.PING_AFTER or self._ping(conn)):
+                return conn
+            self._discard(conn)
+
+    @staticmethod
+    def _ping(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def maintain(self) -> int:
+        """
+        Periodic upkeep, run from a background task (see main.py). Pings connections that have
+        been idle for PING_AFTER or longer, so NAT/firewall and server idle timeouts can't
+        silently kill them between requests, drops dead ones, and reopens connections until the
+        pool is back at minconn. Returns the number of connections discarded.
+        """
+        discarded = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not conn.closed and time.monotonic() - idle_since >= self.PING_AFTER:
+                if self._ping(conn):
+                    idle_since = time.monotonic()
+                else:
+                    conn.close()
+            if conn.closed:
+                self._discard(conn)
+                discarded += 1
+                continue
+            self._idle.put((conn, idle_since))
+
+        while not self.closed:
+            with self._size_lock:
+                if self._size >= self.minconn:
+                    break
+                self._size += 1
+            self.putconn(self._open())
+        return discarded
+
+    def getconn(self, timeout: float = None):
+        """Returns an idle connection, opening a new one if the pool is below maxconn."""
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._requested += 1
+        try:
+            conn = self._acquire(timeout)
+        except Exception:
+            self._record_wait(started, acquired=False)
+            raise
+        self._record_wait(started, acquired=True)
+        return conn
+
+    def _record_wait(self, started: float, acquired: bool):
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            if acquired:
+                self._acquired += 1
+            else:
+                self._unacquired_error += 1
+            self._wait_time_total += waited
+            if waited > self._wait_time_max:
+                self._wait_time_max = waited
+
+    def stats(self) -> dict:
+        """Snapshot of the pool's size and acquisition counters."""
+        with self._stats_lock:
+            requested = self._requested
+            acquired = self._acquired
+            unacquired_error = self._unacquired_error
+            wait_time_total = self._wait_time_total
+            wait_time_max = self._wait_time_max
+        idle = self._idle.qsize()
+        finished = acquired + unacquired_error
+        return {
+            "min_connections": self.minconn,
+            "max_connections": self.maxconn,
+            "size": self._size,
+            "idle": idle,
+            "in_use": max(self._size - idle, 0),
+            "requested": requested,
+            "acquired": acquired,
+            "unacquired_error": unacquired_error,
+            "wait_time_seconds_total": round(wait_time_total, 6),
+            "wait_time_seconds_avg": round(wait_time_total / finished, 6) if finished else 0.0,
+            "wait_time_seconds_max": round(wait_time_max, 6),
+        }
+
+    def _acquire(self, timeout: float = None):
+        if self.closed:
+            raise PoolError("connection pool is closed")
+        conn = self._take_idle()
+        if conn is not None:
+            return conn
+
+        if self._reserve_slot():
+            # Open the new connection outside of any lock; connecting is slow.
+            return self._open()
+
+        # At capacity: queue up behind earlier callers and wait for a direct hand-off.
+        # The wait is sliced so a connection put back just before we queued, or a slot
+        # freed by a discarded connection, is still picked up.
+        waiter = _Waiter()
+        self._waiters.append(waiter)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if waiter.event.wait(self.WAIT_SLICE):
+                return waiter.conn
+
+            conn = self._take_idle()
+            if conn is not None:
+                if waiter.cancel():
+                    return conn
+                # putconn handed us one in the meantime; pass the spare on.
+                self.putconn(conn)
+                return waiter.conn
+
+            if self._reserve_slot():
+                if waiter.cancel():
+                    return self._open()
+                with self._size_lock:
+                    self._size -= 1
+                return waiter.conn
+
+            if self.closed or (deadline is not None and time.monotonic() >= deadline):
+                if waiter.cancel():
+                    if self.closed:
+                        raise PoolError("connection pool is closed")
+                    raise PoolError("connection pool exhausted")
+                return waiter.conn
+
+    def putconn(self, conn, close: bool = False):
+        """Returns a connection to the pool, or discards it if it is closed or close=True."""
+        if self.closed or close or conn.closed:
+            self._discard(conn)
+            return
+        # Oldest waiter first; waiters that already gave up are skipped.
+        while self._waiters:
+            try:
+                waiter = self._waiters.popleft()
+            except IndexError:
+                break
+            if waiter.offer(conn):
+                return
+        self._idle.put((conn, time.monotonic()))
+
+    def closeall(self):
+        """Closes every idle connection. Connections still checked out are closed on return."""
+        self.closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+def init_db_pool(min_conn: int = 1, max_conn: int = DEFAULT_MAX_CONNECTIONS):
     """
     Initializes the PostgreSQL connection pool.
     This function should be called once at application startup.
     """
-    global db_pool
+    global db_pool, prepared_statements_enabled, acquire_timeout
     if db_pool is None:
+        prepared_statements_enabled = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() not in ("0", "false", "no")
+        acquire_timeout = float(os.getenv("DB_ACQUIRE_TIMEOUT", DEFAULT_ACQUIRE_TIMEOUT))
         try:
-            db_pool = ThreadedConnectionPool(
+            db_pool = LockFreePool(
                 min_conn,
                 max_conn,
                 host=os.getenv("DB_HOST", "localhost"),
                 database=os.getenv("DB_NAME", "your_database_name"),
                 user=os.getenv("DB_USER", "your_username"),
                 password=os.getenv("DB_PASSWORD", "your_password"),
-                port=os.getenv("DB_PORT", "5432")
+                port=os.getenv("DB_PORT", "5432"),
+                connection_factory=PreparedConnection
             )
-            print(f"Database connection pool initialized with min={min_conn}, max={max_conn} connections.")
+            print(f"Database connection pool initialized with min={min_conn}, max={max_conn} connections"
+                  f" (prepared statements {'on' if prepared_statements_enabled else 'off'}).")
         except Exception as e:
             print(f"ERROR: Could not initialize database connection pool: {e}", file=sys.stderr)
             # Depending on your application's requirements, you might want to exit here
             # sys.exit(1)
 
+def get_pool_stats():
+    """Returns the pool's runtime counters, or None if the pool is not initialized."""
+    return db_pool.stats() if db_pool else None
+
+def maintain_db_pool() -> int:
+    """Runs the pool's periodic upkeep (LockFreePool.maintain); returns how many dead connections it dropped."""
+    return db_pool.maintain() if db_pool else 0
+
 def close_db_pool():
     """
     Closes the PostgreSQL connection pool.
@@ -45,67 +373,79 @@ def close_db_pool():
         finally:
             db_pool = None
 
-def get_db_connection():
+@contextmanager
+def db_connection():
     """
-    FastAPI dependency that provides a database connection from the pool.
-    Ensures the connection is clean before yielding and cleans up afterwards.
+    Checks a connection out of the pool for the duration of a `with` block.
+    Any transaction left open is rolled back and the connection is returned to the pool on exit.
+
+    psycopg2 is a blocking driver, so route handlers and dependencies that use a connection
+    are plain `def`: FastAPI runs them in its threadpool instead of stalling the event loop.
+    The few `async def` handlers (register/login) hand their DB work to run_in_threadpool.
     """
     if db_pool is None:
         raise HTTPException(status_code=500, detail="Database pool not initialized.")
-
-    conn = None
     try:
-        conn = db_pool.getconn()
+        conn = db_pool.getconn(timeout=acquire_timeout)
+    except PoolError as e:
+        print(f"ERROR: Could not get connection from pool: {e}", file=sys.stderr)
+        if not db_pool.closed:
+            # Every connection stayed busy for acquire_timeout: shed load rather than pile up waiters
+            raise HTTPException(status_code=503, detail="Database busy, please retry.", headers={"Retry-After": "1"})
+        raise HTTPException(status_code=500, detail="Database connection error: Pool acquisition failed.")
 
+    try:
         # Ensure the connection is in autocommit mode
         if conn.autocommit is False:
             conn.autocommit = True
-
-        yield conn # <--- The generator yields here
-
-    # --- CRITICAL FIX: Order of exception handling ---
-    # Handle StopIteration first, as it's a normal signal for generator termination
-    except StopIteration:
-        pass # This is expected when the generator is closed via throw(StopIteration)
-    # Handle PoolError next
-    except PoolError as e:
-        print(f"ERROR: Could not get connection from pool: {e}", file=sys.stderr)
-        raise HTTPException(status_code=500, detail="Database connection error: Pool acquisition failed.")
-    # Handle any other general exceptions last
-    except Exception as e:
-        print(f"ERROR: Unhandled exception in get_db_connection before yield: {type(e).__name__}: {e}", file=sys.stderr)
-        raise HTTPException(status_code=500, detail="An unexpected database error occurred during connection handling.")
+        yield conn
     finally:
-        if conn:
-            # Ensure any active transaction is rolled back before returning the connection.
-            if conn.autocommit is False:
-                try:
-                    conn.rollback()
-                except Exception as e:
-                    print(f"WARNING: Error during rollback before returning connection: {e}", file=sys.stderr)
-            
-            # Ensure conn is not already closed or invalid before putting back
-            if not conn.closed:
-                db_pool.putconn(conn)
-            else:
-                print("WARNING: Tried to put a closed connection back to the pool.", file=sys.stderr)
+        put_db_connection(conn)
+
+def get_db_connection():
+    """
+    FastAPI dependency that provides a database connection from the pool: `conn = Depends(get_db_connection)`.
+    Outside of a request, use `with db_connection() as conn:` instead.
+    """
+    with db_connection() as conn:
+        yield conn
 
-# This helper function is generally not needed if you always use Depends(get_db_connection)
-# in your FastAPI routes. It's included for completeness or specific manual scenarios.
 def put_db_connection(conn):
     """
-    Returns a database connection to the pool.
-    This function is implicitly handled by FastAPI's dependency injection for `get_db_connection`.
-    Only call this manually if you manually acquired a connection outside of the FastAPI dependency system.
+    Returns a database connection to the pool, rolling back any open transaction first.
+    `db_connection()` and `get_db_connection` call this for you.
     """
     if db_pool and conn:
         try:
-            # Ensure the connection is in a clean state (autocommit=True) before returning
-            if conn.autocommit is False:
-                conn.rollback() # Always rollback before putting back if in transaction
-            conn.autocommit = True # Ensure it's autocommit when returned
-            db_pool.putconn(conn)
+            if not conn.closed:
+                # Ensure the connection is in a clean state (autocommit=True) before returning
+                if conn.autocommit is False:
+                    conn.rollback() # Always rollback before putting back if in transaction
+                conn.autocommit = True
+            db_pool.putconn(conn) # Closed connections are discarded by the pool
         except PoolError as e:
             print(f"ERROR: Could not put connection back to pool: {e}", file=sys.stderr)
         except Exception as e:
-            print(f"ERROR: Unhandled exception putting connection back: {e}", file=sys.stderr)
\ No newline at end of file
+            print(f"ERROR: Unhandled exception putting connection back: {e}", file=sys.stderr)
+            db_pool.putconn(conn, close=True)
+
+@contextmanager
+def transaction(conn, isolation_level=None):
+    """
+    Runs the `with` block in an explicit transaction on a pooled (autocommit) connection.
+    Commits on success, rolls back on error, and restores autocommit either way.
+    `isolation_level` (e.g. "REPEATABLE READ") applies to this transaction only.
+    """
+    conn.autocommit = False
+    try:
+        if isolation_level:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation_level}")
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if not conn.closed:
+            conn.autocommit = True
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 # Use relative imports if main.py is in the same package root as database.py
-from .database import init_db_pool, get_db_connection, close_db_pool # Removed put_db_connection from here, it's not needed for manual calls as much
+from .database import init_db_pool, db_connection, close_db_pool, get_pool_stats, maintain_db_pool, DEFAULT_MAX_CONNECTIONS
 from dotenv import load_dotenv
 load_dotenv()
 from .routers import auth, skill, artisan, job, reviews, notification, admin
@@ -11,13 +12,17 @@ from fastapi.middleware.cors import CORSMiddleware
 # For loading environment variables (e.g., from .env file)
 
 import os # To access environment variables for DB pool configuration
+import asyncio
+import anyio.to_thread
+from fastapi.concurrency import run_in_threadpool
 import sys # For writing error messages to stderr
 
 # Load environment variables from .env file (if it exists)
 
 
 # Create a FastAPI application instance
-app = FastAPI()
+# orjson serializes response bodies (incl. datetimes) much faster than the stdlib json encoder
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Configure CORS - IMPORTANT for frontend communication
 origins = [
@@ -34,65 +39,78 @@ app.add_middleware(
     allow_headers=["*"], # Allows all headers (including Authorization header for tokens)
 )
 
+# Idle pooled connections are pinged (and dead ones replaced) this often, so a quiet period
+# doesn't leave the pool full of sockets a NAT or the server has already dropped
+POOL_MAINTENANCE_INTERVAL = float(os.getenv("DB_POOL_MAINTENANCE_INTERVAL", 60))
+_pool_maintenance_task = None
+
+async def _maintain_pool_periodically():
+    while True:
+        await asyncio.sleep(POOL_MAINTENANCE_INTERVAL)
+        try:
+            discarded = await run_in_threadpool(maintain_db_pool)
+            if discarded:
+                print(f"Pool maintenance: replaced {discarded} dead connection(s).")
+        except Exception as e:
+            print(f"ERROR: Pool maintenance failed: {e}", file=sys.stderr)
+
 # FastAPI lifecycle events for database connection management
 @app.on_event("startup")
 async def startup_event():
     print("Application startup: Initializing database...")
+    # Every DB-bound handler runs in anyio's worker threads (40 by default); raise the limit
+    # with THREADPOOL_SIZE when DB_MAX_CONNECTIONS is set higher than that
+    threadpool_size = int(os.getenv("THREADPOOL_SIZE", 0))
+    if threadpool_size > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
     try:
         # Get min/max connections from environment variables, with defaults
         min_connections = int(os.getenv("DB_MIN_CONNECTIONS", 1))
-        max_connections = int(os.getenv("DB_MAX_CONNECTIONS", 10))
+        max_connections = int(os.getenv("DB_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
 
         # --- CRITICAL FIX: Initialize the database pool first ---
         init_db_pool(min_connections, max_connections)
         print("Database connection pool initialized.")
 
         # --- OPTIONAL: Verify connection by acquiring and releasing one ---
-        # We need to explicitly manage the generator context to ensure its 'finally' block runs
-        db_conn_generator = get_db_connection()
-        conn_for_test = None # Initialize to None
-
         try:
-            # Acquire the connection from the generator
-            conn_for_test = db_conn_generator.__next__()
-            # Perform a simple query to verify
-            with conn_for_test.cursor() as cursor:
-                cursor.execute("SELECT 1")
-            print("Database connection verified on startup.")
-        except StopIteration:
-            # This means the generator finished without yielding anything, which shouldn't happen
-            print("WARNING: get_db_connection did not yield a connection during startup verification.", file=sys.stderr)
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                # Load the skill name -> id map now so the first artisan write doesn't pay for it
+                skill_count = len(skill.get_skill_map(conn, refresh=True))
+            print(f"Database connection verified on startup ({skill_count} skills cached).")
         except Exception as e:
             # Catch specific database errors if desired, e.g., psycopg2.Error
             print(f"ERROR: Failed to verify database connection on startup: {e}", file=sys.stderr)
             # Raise an HTTPException if DB connection is truly critical for app startup
             # raise HTTPException(status_code=500, detail="Failed to connect to database at startup.")
-        finally:
-            # --- CRITICAL FIX: Explicitly close the generator to ensure its 'finally' block runs ---
-            # This ensures the connection is returned to the pool by get_db_connection's own cleanup.
-            # DO NOT call put_db_connection() manually here.
-            if db_conn_generator:
-                try:
-                    db_conn_generator.throw(StopIteration) # Forces the generator to close, running its finally block
-                except StopIteration:
-                    pass # This is an expected exception when using throw(StopIteration) to close a generator
-                except Exception as close_exc:
-                    print(f"ERROR: Exception while explicitly closing database connection generator: {close_exc}", file=sys.stderr)
 
     except Exception as e:
         print(f"CRITICAL ERROR: Failed to initialize database pool: {e}", file=sys.stderr)
         # Re-raise to prevent the FastAPI application from starting if DB initialization fails
         raise
 
+    global _pool_maintenance_task
+    _pool_maintenance_task = asyncio.create_task(_maintain_pool_periodically())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     print("Application shutdown: Closing database connection pool...")
+    if _pool_maintenance_task:
+        _pool_maintenance_task.cancel()
     close_db_pool()
 
 @app.get("/")
 async def read_root():
     return {"message": "Jua Kali Backend API is running! (FastAPI)"}
 
+@app.get("/metrics")
+async def read_metrics(current_admin_user = Depends(admin.get_current_admin_user)):
+    # Admin only: pool internals (connection counts, wait times, error counters) aren't public
+    # Connection pool counters (requested / acquired / unacquired_error / wait time) for sizing the pool
+    return {"db_pool": get_pool_stats()}
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(skill.router)
@@ -1,12 +1,16 @@
 # backend/routers/admin.py
 
+import io
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from psycopg2.extras import RealDictCursor
+from fastapi.responses import ORJSONResponse
+from psycopg2.errors import UniqueViolation
+from psycopg2.extras import RealDictCursor, execute_values
 
-from backend.database import get_db_connection, put_db_connection
+from backend.database import execute_prepared, get_db_connection
 from backend.routers.auth import get_current_user
+from backend.routers.skill import get_skill_map, invalidate_skill_cache
 from backend.schemas import *
 
 router = APIRouter(
@@ -14,315 +18,416 @@ router = APIRouter(
     tags=["Admin"]
 )
 
+# Enum values resolved once at import instead of on every request / row
+_ADMIN_VALUE = UserType.admin.value
+_ARTISAN_VALUE = UserType.artisan.value
+
+# Bulk skill imports above this size go through COPY instead of multi-row INSERTs
+_BULK_COPY_THRESHOLD = 10_000
+
 # --- Dependency for Admin User ---
 async def get_current_admin_user(current_user: UserBase = Depends(get_current_user)):
-    if current_user.user_type != UserType.admin.value: # Check against the Enum value
+    if current_user.user_type != _ADMIN_VALUE: # Check against the Enum value
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only administrators are allowed to perform this action.")
     return current_user
 
+# The list endpoints return plain dicts through ORJSONResponse with response_model=None, so
+# rows go straight to orjson without a Pydantic round-trip. The models are still listed under
+# `responses` to keep the OpenAPI docs accurate. orjson has no Decimal support, hence the
+# NUMERIC columns are cast to float8 in SQL.
+
 # --- 1. Get All Users (Admin Only) ---
-@router.get("/users", response_model=List[UserProfile])
-async def get_all_users_admin(
+@router.get("/users", response_model=None, response_class=ORJSONResponse, responses={200: {"model": List[UserProfile]}})
+def get_all_users_admin(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     user_type: Optional[UserType] = Query(None, description="Filter by user type (client or artisan)"),
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        query = """
-            SELECT
-                u.id, u.full_name, u.email, u.phone_number, u.user_type, u.location,
-                ad.bio, ad.years_experience, ad.average_rating, ad.total_reviews, ad.is_available,
-                (SELECT array_agg(s.name) FROM artisan_skills us JOIN skills s ON us.skill_id = s.id WHERE us.artisan_id = u.id) AS skills
-            FROM users u
-            LEFT JOIN artisan_details ad ON u.id = ad.user_id
-        """
-        count_query = "SELECT COUNT(u.id) FROM users u"
-        where_clauses = []
-        query_params = []
-
-        if user_type:
-            where_clauses.append("u.user_type = %s")
-            query_params.append(user_type.value)
-
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-            count_query += " WHERE " + " AND ".join(where_clauses)
-
-        query += " ORDER BY u.created_at DESC LIMIT %s OFFSET %s;"
-        query_params.extend([limit, offset])
-
-        cursor.execute(query, query_params)
-        users_data = cursor.fetchall()
-
-        # Execute count query separately
-        cursor.execute(count_query, query_params[:-2]) # Remove limit/offset from count query params
-        total_count = cursor.fetchone()['count']
-
-        # Manually map to UserProfile due to nested structure (artisan_details and skills)
-        user_profiles = []
-        for user_row in users_data:
-            artisan_details = None
-            if user_row['user_type'] == UserType.artisan.value:
-                artisan_details = ArtisanDetails(
-                    bio=user_row.get('bio'),
-                    years_experience=user_row.get('years_experience'),
-                    average_rating=user_row.get('average_rating'),
-                    total_reviews=user_row.get('total_reviews'),
-                    is_available=user_row.get('is_available')
+        # Plain tuple cursor: rows come back as C-built tuples instead of RealDictRow
+        # objects, and are unpacked positionally below.
+        with conn.cursor() as cursor:
+            # Page the filtered users first, then join details and aggregate skills for just
+            # those rows, so a small page doesn't aggregate skills for the whole table
+            query = """
+                WITH page AS (
+                    SELECT u.id, u.full_name, u.email, u.phone_number, u.user_type, u.location,
+                           u.created_at, u.updated_at
+                    FROM users u
+            """
+            # Each filter combination is its own prepared statement, named after the filters it uses
+            statement_name = "admin_users"
+            where_clauses = []
+            query_params = []
+
+            if user_type:
+                query_params.append(user_type.value)
+                where_clauses.append(f"u.user_type = ${len(query_params)}")
+                statement_name += "_type"
+
+            if where_clauses:
+                query += " WHERE " + " AND ".join(where_clauses)
+
+            query += f"""
+                    ORDER BY u.created_at DESC LIMIT ${len(query_params) + 1} OFFSET ${len(query_params) + 2}
                 )
-            user_profiles.append(UserProfile(
-                id=user_row['id'],
-                full_name=user_row['full_name'],
-                email=user_row['email'],
-                phone_number=user_row['phone_number'],
-                user_type=user_row['user_type'],
-                location=user_row['location'],
-                artisan_details=artisan_details,
-                skills=user_row.get('skills') # `array_agg` returns a list, which Pydantic handles
-            ))
-
-        # You might want a JobsListResponse style wrapper here if you want total_count, page, size info
-        # For now, returning just the list of users as requested by response_model=List[UserProfile]
-        return user_profiles # Or wrap in a pagination schema if created
+                SELECT
+                    p.id, p.full_name, p.email, p.phone_number, p.user_type, p.location,
+                    p.created_at, p.updated_at,
+                    ad.bio, ad.years_experience, ad.average_rating::float8 AS average_rating, ad.total_reviews, ad.is_available,
+                    ad.created_at AS ad_created_at, ad.updated_at AS ad_updated_at,
+                    sk.skills
+                FROM page p
+                LEFT JOIN artisan_details ad ON p.id = ad.user_id
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(s.name) AS skills
+                    FROM artisan_skills us
+                    JOIN skills s ON us.skill_id = s.id
+                    WHERE us.artisan_id = p.id
+                ) sk ON TRUE
+                ORDER BY p.created_at DESC
+            """
+            query_params.extend([limit, offset])
+
+            execute_prepared(cursor, statement_name, query, query_params)
+            users_data = cursor.fetchall()
+
+            # Reshape rows into the nested UserProfile layout
+            user_profiles = [
+                {
+                    'id': user_id,
+                    'full_name': full_name,
+                    'email': email,
+                    'phone_number': phone_number,
+                    'user_type': user_type_value,
+                    'location': location,
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                    'artisan_details': {
+                        'user_id': user_id,
+                        'bio': bio,
+                        'years_experience': years_experience,
+                        'average_rating': average_rating,
+                        'total_reviews': total_reviews,
+                        'is_available': is_available,
+                        'skills': skills,
+                        'created_at': ad_created_at,
+                        'updated_at': ad_updated_at
+                    } if user_type_value == _ARTISAN_VALUE and ad_created_at is not None else None,
+                    'skills': skills # `array_agg` returns a list, which Pydantic handles
+                }
+                for (user_id, full_name, email, phone_number, user_type_value, location, created_at, updated_at,
+                     bio, years_experience, average_rating, total_reviews, is_available,
+                     ad_created_at, ad_updated_at, skills) in users_data
+            ]
+
+            # You might want a JobsListResponse style wrapper here if you want total_count, page, size info
+            # For now, returning just the list of users as requested by response_model=List[UserProfile]
+            return user_profiles # Or wrap in a pagination schema if created
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching all users for admin: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching users.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
 # --- 2. Get All Jobs (Admin Only) ---
-@router.get("/jobs", response_model=JobsListResponse)
-async def get_all_jobs_admin(
+@router.get("/jobs", response_model=None, response_class=ORJSONResponse, responses={200: {"model": JobsListResponse}})
+def get_all_jobs_admin(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     status_filter: Optional[JobStatus] = Query(None, alias="status", description="Filter by job status"),
     client_id: Optional[int] = Query(None, description="Filter by client ID"),
     assigned_artisan_id: Optional[int] = Query(None, description="Filter by assigned artisan ID"),
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        query_base = """
-            SELECT
-                j.id, j.title, j.description, j.client_id, j.status, j.location, j.budget,
-                j.created_at, j.updated_at, j.assigned_artisan_id,
-                (SELECT array_agg(s.name) FROM job_required_skills jrs JOIN skills s ON jrs.skill_id = s.id WHERE jrs.job_id = j.id) AS required_skills
-            FROM jobs j
-        """
-        count_query_base = "SELECT COUNT(j.id) FROM jobs j"
-
-        where_clauses = []
-        query_params = []
-
-        if status_filter:
-            where_clauses.append("j.status = %s")
-            query_params.append(status_filter.value)
-        if client_id:
-            where_clauses.append("j.client_id = %s")
-            query_params.append(client_id)
-        if assigned_artisan_id:
-            where_clauses.append("j.assigned_artisan_id = %s")
-            query_params.append(assigned_artisan_id)
-
-        full_query = query_base
-        count_full_query = count_query_base
-        if where_clauses:
-            full_query += " WHERE " + " AND ".join(where_clauses)
-            count_full_query += " WHERE " + " AND ".join(where_clauses)
-
-        full_query += " ORDER BY j.created_at DESC LIMIT %s OFFSET %s;"
-        query_params.extend([limit, offset])
-
-        cursor.execute(full_query, query_params)
-        jobs_data = cursor.fetchall()
-
-        cursor.execute(count_full_query, query_params[:-2]) # Params excluding limit/offset
-        total_count = cursor.fetchone()['count']
-
-        # Map to JobResponse schema
-        jobs = [JobResponse(**job) for job in jobs_data]
-
-        return JobsListResponse(jobs=jobs, total_count=total_count, page=offset // limit + 1, size=limit)
+        with conn.cursor() as cursor:
+            # Page the filtered jobs first (the window count runs over the filtered rows before
+            # LIMIT), then aggregate required skills for just the jobs on the page
+            query_base = """
+                WITH page AS (
+                    SELECT j.id, j.title, j.description, j.client_id, j.status, j.location, j.budget,
+                           j.created_at, j.assigned_artisan_id,
+                           COUNT(*) OVER() AS total_count -- Total matching rows, computed in the same scan
+                    FROM jobs j
+            """
+
+            # Each filter combination (8 in total) is its own prepared statement
+            statement_name = "admin_jobs"
+            where_clauses = []
+            query_params = []
+
+            if status_filter:
+                query_params.append(status_filter.value)
+                where_clauses.append(f"j.status = ${len(query_params)}")
+                statement_name += "_status"
+            if client_id:
+                query_params.append(client_id)
+                where_clauses.append(f"j.client_id = ${len(query_params)}")
+                statement_name += "_client"
+            if assigned_artisan_id:
+                query_params.append(assigned_artisan_id)
+                where_clauses.append(f"j.assigned_artisan_id = ${len(query_params)}")
+                statement_name += "_artisan"
+
+            where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            full_query = query_base + where_sql
+
+            full_query += f"""
+                    ORDER BY j.created_at DESC LIMIT ${len(query_params) + 1} OFFSET ${len(query_params) + 2}
+                )
+                SELECT
+                    p.id, p.title, p.description, p.client_id, p.status, p.location, p.budget::float8 AS budget,
+                    p.created_at, p.assigned_artisan_id,
+                    COALESCE(rs.required_skills, '{{}}') AS required_skills,
+                    p.total_count
+                FROM page p
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(s.name) AS required_skills
+                    FROM job_required_skills jrs
+                    JOIN skills s ON jrs.skill_id = s.id
+                    WHERE jrs.job_id = p.id
+                ) rs ON TRUE
+                ORDER BY p.created_at DESC
+            """
+            query_params.extend([limit, offset])
+
+            execute_prepared(cursor, statement_name, full_query, query_params)
+            jobs_data = cursor.fetchall()
+            if jobs_data:
+                total_count = jobs_data[0][-1]
+            elif offset > 0:
+                # Past the last page there is no row to carry the window count
+                execute_prepared(cursor, statement_name + "_count", "SELECT COUNT(*) FROM jobs j" + where_sql, query_params[:-2])
+                total_count = cursor.fetchone()[0]
+            else:
+                total_count = 0
+
+            # Same shape as JobsListResponse / JobResponse
+            jobs = [
+                {
+                    'id': job_id,
+                    'title': title,
+                    'description': description,
+                    'client_id': job_client_id,
+                    'status': job_status,
+                    'location': location,
+                    'budget': budget,
+                    'created_at': created_at,
+                    'assigned_artisan_id': job_artisan_id,
+                    'required_skills': required_skills,
+                    'reviewed': False
+                }
+                for (job_id, title, description, job_client_id, job_status, location, budget,
+                     created_at, job_artisan_id, required_skills, _total_count) in jobs_data
+            ]
+
+            return {'jobs': jobs, 'total_count': total_count, 'page': offset // limit + 1, 'size': limit}
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching all jobs for admin: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching jobs.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
 @router.post("/skills", response_model=SkillResponse, status_code=status.HTTP_201_CREATED)
-async def create_skill(
+def create_skill(
     skill_data: SkillCreate,
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check if skill already exists
-        cursor.execute("SELECT id FROM skills WHERE name = %s", (skill_data.name,))
-        if cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Skill with this name already exists.")
-
-        cursor.execute(
-            "INSERT INTO skills (name) VALUES (%s) RETURNING id, name;",
-            (skill_data.name,)
-        )
-        new_skill = cursor.fetchone()
-        conn.commit()
-
-        return SkillResponse(**new_skill)
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            # The UNIQUE(name) constraint decides duplicates; no row back means the name was taken
+            cursor.execute(
+                "INSERT INTO skills (name) VALUES (%s) ON CONFLICT (name) DO NOTHING RETURNING id, name;",
+                (skill_data.name,)
+            )
+            new_skill = cursor.fetchone()
+            if not new_skill:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Skill with this name already exists.")
+            invalidate_skill_cache()
+
+            return SkillResponse(**new_skill)
 
     except HTTPException:
-        if conn: conn.rollback()
         raise
     except Exception as e:
-        if conn: conn.rollback()
         print(f"Error creating skill: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error creating skill.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
 
-@router.get("/skills", response_model=List[SkillResponse])
-async def get_all_skills_admin(
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+def _copy_escape(value: str) -> str:
+    """Escapes a value for COPY's text format."""
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+@router.post("/skills/bulk", response_model=List[SkillResponse], status_code=status.HTTP_201_CREATED)
+def create_skills_bulk(
+    skills_data: List[SkillCreate],
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
+    """
+    Creates many skills at once. Names that already exist are skipped;
+    only the newly created skills are returned.
+    """
+    names = list(dict.fromkeys(skill.name for skill in skills_data)) # De-duplicate, keep order
+    if not names:
+        return []
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            if len(names) <= _BULK_COPY_THRESHOLD:
+                # One round-trip per 500 rows
+                new_skills = execute_values(
+                    cursor,
+                    "INSERT INTO skills (name) VALUES %s ON CONFLICT (name) DO NOTHING RETURNING id, name",
+                    [(name,) for name in names],
+                    page_size=500,
+                    fetch=True
+                )
+            else:
+                # Very large imports: stream raw rows with COPY into a temp table, then insert the new ones
+                conn.autocommit = False
+                cursor.execute("CREATE TEMP TABLE skills_import (name VARCHAR(100)) ON COMMIT DROP")
+                cursor.copy_expert(
+                    "COPY skills_import (name) FROM STDIN",
+                    io.StringIO("\n".join(_copy_escape(name) for name in names))
+                )
+                cursor.execute(
+                    "INSERT INTO skills (name) SELECT name FROM skills_import ON CONFLICT (name) DO NOTHING RETURNING id, name"
+                )
+                new_skills = cursor.fetchall()
+                conn.commit()
+            if new_skills:
+                invalidate_skill_cache()
+
+            return [SkillResponse(**skill) for skill in new_skills]
+
+    except Exception as e:
+        if conn: conn.rollback()
+        print(f"Error bulk creating skills: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error creating skills.")
+
 
-        cursor.execute("SELECT id, name FROM skills ORDER BY name;")
-        skills = cursor.fetchall()
+@router.get("/skills", response_model=None, response_class=ORJSONResponse, responses={200: {"model": List[SkillResponse]}})
+def get_all_skills_admin(
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
+):
+    try:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "admin_skills", "SELECT id, name FROM skills ORDER BY name")
+            skills = cursor.fetchall()
 
-        return [SkillResponse(**skill) for skill in skills]
+            return [{'id': skill_id, 'name': name} for skill_id, name in skills]
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching all skills for admin: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching skills.")
-    finally:
-        if conn:
-            put_db_connection(conn)
+
+
+@router.post("/reload-skills")
+def reload_skills(
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
+):
+    # Refreshes the in-process skill name -> id cache, e.g. after skills were edited directly in the database
+    try:
+        return {"skills_loaded": len(get_skill_map(conn, refresh=True))}
+    except Exception as e:
+        print(f"Error reloading skill cache: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error reloading skills.")
 
 
 @router.get("/skills/{skill_id}", response_model=SkillResponse)
-async def get_skill_by_id_admin(
+def get_skill_by_id_admin(
     skill_id: int,
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT id, name FROM skills WHERE id = %s;", (skill_id,))
+            skill = cursor.fetchone()
 
-        cursor.execute("SELECT id, name FROM skills WHERE id = %s;", (skill_id,))
-        skill = cursor.fetchone()
+            if not skill:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
 
-        if not skill:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
-
-        return SkillResponse(**skill)
+            return SkillResponse(**skill)
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching skill {skill_id} for admin: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching skill.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
 
 @router.put("/skills/{skill_id}", response_model=SkillResponse)
-async def update_skill(
+def update_skill(
     skill_id: int,
     skill_data: SkillCreate, # Reuse SkillCreate for update, as it only has 'name'
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check if the skill to be updated exists
-        cursor.execute("SELECT id FROM skills WHERE id = %s;", (skill_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
-
-        # Check for unique name conflict if changing name
-        cursor.execute("SELECT id FROM skills WHERE name = %s AND id != %s;", (skill_data.name, skill_id))
-        if cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another skill with this name already exists.")
-
-        cursor.execute(
-            "UPDATE skills SET name = %s WHERE id = %s RETURNING id, name;",
-            (skill_data.name, skill_id)
-        )
-        updated_skill = cursor.fetchone()
-        conn.commit()
-
-        return SkillResponse(**updated_skill)
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            # One round-trip decides all three outcomes: the update only happens when no other skill
+            # has the name, and `existed` tells a missing skill (404) apart from a name clash (409).
+            try:
+                execute_prepared(cursor, "admin_update_skill", """
+                    WITH upd AS (
+                        UPDATE skills SET name = $1
+                        WHERE id = $2 AND NOT EXISTS (SELECT 1 FROM skills WHERE name = $1 AND id <> $2)
+                        RETURNING id, name
+                    )
+                    SELECT upd.id, upd.name, EXISTS (SELECT 1 FROM skills WHERE id = $2) AS existed
+                    FROM (SELECT 1) AS one
+                    LEFT JOIN upd ON true
+                """, (skill_data.name, skill_id))
+            except UniqueViolation:
+                # A concurrent writer took the name between our check and the update
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another skill with this name already exists.")
+            result = cursor.fetchone()
+            if result['id'] is None:
+                if not result['existed']:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another skill with this name already exists.")
+            invalidate_skill_cache() # The old name must stop resolving
+
+            return SkillResponse(id=result['id'], name=result['name'])
 
     except HTTPException:
-        if conn: conn.rollback()
         raise
     except Exception as e:
-        if conn: conn.rollback()
         print(f"Error updating skill {skill_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error updating skill.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
 
 @router.delete("/skills/{skill_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_skill(
+def delete_skill(
     skill_id: int,
-    current_admin_user: UserBase = Depends(get_current_admin_user)
+    current_admin_user: UserBase = Depends(get_current_admin_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor() # No need for RealDictCursor for DELETE
+        with conn.cursor() as cursor: # No need for RealDictCursor for DELETE
+            # RETURNING tells us whether a row was there to delete, no separate existence check needed
+            cursor.execute("DELETE FROM skills WHERE id = %s RETURNING id;", (skill_id,))
+            if not cursor.fetchone():
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
+            invalidate_skill_cache()
 
-        # Check if skill exists before attempting to delete
-        cursor.execute("SELECT id FROM skills WHERE id = %s;", (skill_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found.")
-
-        cursor.execute("DELETE FROM skills WHERE id = %s;", (skill_id,))
-        conn.commit()
-
-        # No content to return for 204
-        return
+            # No content to return for 204
+            return
 
     except HTTPException:
-        if conn: conn.rollback()
         raise
     except Exception as e:
-        if conn: conn.rollback()
         print(f"Error deleting skill {skill_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error deleting skill.")
-    finally:
-        if conn:
-            put_db_connection(conn)
\ No newline at end of file
@@ -1,45 +1,89 @@
 # backend/routers/artisan.py
 
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from backend.database import get_db_connection, put_db_connection
-from backend.routers.auth import get_current_user 
-from backend.schemas import *# Import relevant schemas
-from psycopg2.extras import execute_values, RealDictCursor 
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from backend.database import get_db_connection, execute_prepared, transaction
+from backend.routers.auth import get_current_user, invalidate_current_user
+from backend.routers.skill import resolve_skill_ids, merge_artisan_skills
+from backend.schemas import (
+    ArtisanDetails, ArtisanDetailsUpdate, ArtisansListResponse, ReviewResponse,
+    UserBase, UserProfile, UserType
+)
+from psycopg2.errors import SerializationFailure
+from psycopg2.extras import RealDictCursor 
 from typing import List, Optional # Import Optional for fields that might be None
+from pydantic import TypeAdapter
+import re
+import threading
+import time
 
 router = APIRouter(
     prefix="/api/artisans", # All routes in this router will start with /api/artisans
     tags=["Artisans"]        # For API documentation
 )
 
-@router.get("/", response_model=ArtisansListResponse) # <--- Change response_model here
-async def get_all_artisans(
+# --- Short-lived cache for the artisan listing ---
+# Keyed by the full set of filters and pagination; entries expire after ARTISANS_CACHE_TTL
+# seconds and the whole cache is dropped whenever an artisan edits their profile.
+ARTISANS_CACHE_TTL = 15 # Seconds
+_ARTISANS_CACHE_MAX_ENTRIES = 256 # Oldest entries are evicted first beyond this
+
+_artisans_cache = {} # (filters...) -> (stored_at, response JSON text)
+_artisans_cache_lock = threading.Lock()
+
+# Totals for cursor (keyset) pages, keyed by filters only. A cursor page can't take the total
+# from its window count, so it reuses the last known one rather than counting again.
+# Same TTL and size bound as the listing cache, since the keys are just as client-controlled.
+_artisans_total_cache = {} # (location, skills, min_years_experience) -> (stored_at, total_count)
+
+def invalidate_artisans_cache():
+    with _artisans_cache_lock:
+        _artisans_cache.clear()
+        _artisans_total_cache.clear()
+
+# The listing document is built by jsonb in SQL, so values are formatted the way Pydantic
+# serializes them on the other endpoints: timestamps as UTC with a trailing "Z" (fraction
+# dropped when it is zero), floats always with a decimal point (0.0, 4.5).
+def _json_utc(column: str) -> str:
+    return f"""replace(to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"'), '.000000Z', 'Z')"""
+
+def _json_float(column: str) -> str:
+    # float8's text form is the shortest exact one, like Python's repr; numeric keeps the ".0"
+    return f"""({column}::float8::text || CASE WHEN {column}::float8::text ~ '^-?[0-9]+$' THEN '.0' ELSE '' END)::numeric"""
+
+# Keyset cursor: "<created_at as microseconds since the Unix epoch>.<user id>" of the last row
+# on the previous page. Integer microseconds keep the timestamp exact across the round-trip.
+_ARTISANS_CURSOR_RE = re.compile(r"^(-?\d+)\.(\d+)$")
+
+# The listing is read-only, so PostgreSQL builds the exact response document and the
+# handler passes the JSON text straight through instead of validating every row into
+# Pydantic models and serializing them again. The schema is kept for the OpenAPI docs.
+@router.get("/", response_model=None, response_class=Response, responses={200: {"model": ArtisansListResponse, "content": {"application/json": {}}}})
+def get_all_artisans(
     location: Optional[str] = Query(None, description="Filter artisans by location"),
     skills: Optional[str] = Query(None, description="Comma-separated list of skills (e.g., 'Plumbing,Electrical')"),
     min_years_experience: Optional[int] = Query(None, ge=0, description="Minimum years of experience for the artisan"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
     size: int = Query(10, ge=1, le=100, description="Number of items per page"),
-    current_user: UserBase = Depends(get_current_user) # Keep authentication
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous response; continues after it instead of using page"),
+    current_user: UserBase = Depends(get_current_user), # Keep authentication
+    conn = Depends(get_db_connection)
 ):
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Base query parts for artisan profiles (joining users, artisan_details, and skills)
-        # This complex query selects all details needed for UserProfile
-        main_query_base = """
-            SELECT
-                u.id, u.full_name, u.email, u.phone_number, u.location, u.user_type, u.created_at,
-                ad.bio, ad.years_experience,
-                ARRAY_AGG(s.name ORDER BY s.name) FILTER (WHERE s.name IS NOT NULL) AS skill_names
-            FROM users u
-            LEFT JOIN artisan_details ad ON u.id = ad.user_id
-            LEFT JOIN artisan_skills ars ON u.id = ars.artisan_id
-            LEFT JOIN skills s ON ars.skill_id = s.id
-        """
+    keyset = None
+    if cursor:
+        match = _ARTISANS_CURSOR_RE.match(cursor)
+        if not match:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+        keyset = (int(match.group(1)), int(match.group(2)))
+
+    filters_key = (location, skills, min_years_experience)
+    cache_key = (location, skills, min_years_experience, page, size, cursor)
+    with _artisans_cache_lock:
+        cached = _artisans_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < ARTISANS_CACHE_TTL:
+        return Response(content=cached[1], media_type="application/json")
 
-        count_query_base = "SELECT COUNT(DISTINCT u.id) FROM users u"
+    try:
+        db_cursor = conn.cursor()
 
         # Filter conditions and parameters
         where_clauses = ["u.user_type = 'artisan'"] # Always filter for artisans
@@ -48,196 +92,276 @@ async def get_all_artisans(
         if location:
             where_clauses.append("u.location ILIKE %s")
             query_params.append(f"%{location}%")
+        # artisan_details only takes part in the filtering when it is filtered on; an inner
+        # join is equivalent there since a missing row can't satisfy the condition
+        filter_join = ""
         if min_years_experience is not None:
-            # Filter by years_experience. Assumes artisan_details might not exist for all.
+            filter_join = "JOIN artisan_details ad ON u.id = ad.user_id"
             where_clauses.append("ad.years_experience >= %s")
             query_params.append(min_years_experience)
 
-        # Skills filtering logic (similar to jobs, requiring all specified skills)
+        # Skills filtering logic, requiring all specified skills. users.skill_ids mirrors
+        # artisan_skills (see Db_setup/artisan_skill_ids.sql), so this is one GIN containment probe.
         if skills:
             required_skill_names = [s.strip() for s in skills.split(',') if s.strip()]
             if required_skill_names:
-                skill_filter_clause = f"""
-                    u.id IN (
-                        SELECT ars_sub.artisan_id
-                        FROM artisan_skills ars_sub
-                        JOIN skills s_sub ON ars_sub.skill_id = s_sub.id
-                        WHERE s_sub.name IN ({', '.join(['%s'] * len(required_skill_names))})
-                        GROUP BY ars_sub.artisan_id
-                        HAVING COUNT(DISTINCT s_sub.id) = %s
-                    )
-                """
-                where_clauses.append(skill_filter_clause)
-                query_params.extend(required_skill_names)
-                query_params.append(len(required_skill_names))
+                skill_ids_by_name, unknown_skills = resolve_skill_ids(conn, required_skill_names)
+                if unknown_skills:
+                    where_clauses.append("FALSE") # Nobody can have a skill that doesn't exist
+                else:
+                    where_clauses.append("u.skill_ids @> %s::int[]")
+                    query_params.append(list(set(skill_ids_by_name.values())))
 
         # Construct the WHERE clause
-        full_where_clause = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-
+        full_where_clause = " WHERE " + " AND ".join(where_clauses)
 
         # -------------------------------------------------------------
         # Pagination Logic
         # -------------------------------------------------------------
-        offset = (page - 1) * size
-
-        # 1. Get total count of artisans matching filters
-        # For count query, we only need to join users and artisan_skills for skill filtering
-        count_query_full = f"""
-            {count_query_base}
-            LEFT JOIN artisan_details ad ON u.id = ad.user_id
-            LEFT JOIN artisan_skills ars ON u.id = ars.artisan_id
-            LEFT JOIN skills s ON ars.skill_id = s.id
-            {full_where_clause}
-        """
-        cursor.execute(count_query_full, query_params)
-        total_count = cursor.fetchone()[0]
-
-        # 2. Get the artisans for the current page
+        # With a cursor the page starts right after the previous page's last row, so
+        # Postgres walks the (created_at, id) index instead of reading and skipping OFFSET rows.
+        page_where_clause = full_where_clause
+        page_params = list(query_params)
+        cached_total = None
+        if keyset:
+            page_where_clause += " AND (u.created_at, u.id) < (TIMESTAMPTZ 'epoch' + %s * INTERVAL '1 microsecond', %s)"
+            page_params.extend(keyset)
+            offset = 0
+            with _artisans_cache_lock:
+                total_entry = _artisans_total_cache.get(filters_key)
+            if total_entry and time.monotonic() - total_entry[0] < ARTISANS_CACHE_TTL:
+                cached_total = total_entry[1]
+            # The window count only covers rows after the cursor
+            total_sources = "%s::bigint"
+        else:
+            offset = (page - 1) * size
+            total_sources = "%s::bigint, (SELECT total_count FROM page LIMIT 1)"
+
+        # Pick the page's ids from the filtered users first, then join details and collect
+        # skills for just those rows. The total comes from the cached value or the window
+        # count on the page rows; the fallback COUNT only runs when neither is available.
         final_query = f"""
-            {main_query_base}
-            {full_where_clause}
-            GROUP BY u.id, u.full_name, u.email, u.phone_number, u.location, u.user_type, u.created_at, ad.bio, ad.years_experience
-            ORDER BY u.created_at DESC
-            LIMIT %s OFFSET %s;
-        """
-        # Append pagination params to the existing filters
-        paged_query_params = query_params + [size, offset]
-
-        cursor.execute(final_query, paged_query_params)
-        artisan_rows = cursor.fetchall()
-
-        artisans_list = []
-        for row in artisan_rows:
-            (user_id, full_name, email, phone_number, location, user_type_str, created_at,
-             bio, years_experience, skill_names_array) = row
-
-            # Handle ARRAY_AGG returning {NULL} for no skills or empty array
-            parsed_skills = [s for s in (skill_names_array if skill_names_array else []) if s is not None]
-
-            artisans_list.append(
-                UserProfile(
-                    id=user_id,
-                    full_name=full_name,
-                    email=email,
-                    phone_number=phone_number,
-                    location=location,
-                    user_type=UserType(user_type_str),
-                    created_at=created_at,
-                    artisan_details=ArtisanDetails(
-                        bio=bio,
-                        years_experience=years_experience,
-                        # average_rating, total_reviews, is_available are not yet handled, will be None
-                    ),
-                    skills=parsed_skills
-                )
+            WITH page_ids AS (
+                SELECT u.id, COUNT(*) OVER() AS total_count
+                FROM users u
+                {filter_join}
+                {page_where_clause}
+                ORDER BY u.created_at DESC, u.id DESC
+                LIMIT %s OFFSET %s
+            ),
+            page AS (
+                SELECT
+                    u.id, u.full_name, u.email, u.phone_number, u.location, u.user_type,
+                    u.created_at, u.updated_at,
+                    ad.user_id AS details_user_id, ad.bio, ad.years_experience,
+                    ad.average_rating::float8 AS average_rating, ad.total_reviews, ad.is_available,
+                    ad.created_at AS details_created_at, ad.updated_at AS details_updated_at,
+                    pi.total_count
+                FROM page_ids pi
+                JOIN users u ON u.id = pi.id
+                LEFT JOIN artisan_details ad ON u.id = ad.user_id
+            ),
+            profiles AS (
+                SELECT
+                    page.*,
+                    ARRAY(
+                        SELECT s.name
+                        FROM artisan_skills ars
+                        JOIN skills s ON ars.skill_id = s.id
+                        WHERE ars.artisan_id = page.id
+                        ORDER BY s.name
+                    ) AS skill_names
+                FROM page
+            ),
+            total AS (
+                SELECT COALESCE(
+                    {total_sources},
+                    (SELECT COUNT(*) FROM users u {filter_join} {full_where_clause})
+                ) AS total_count
             )
-
-        return ArtisansListResponse(
-            artisans=artisans_list,
-            total_count=total_count,
-            page=page,
-            size=size
-        )
+            SELECT jsonb_build_object(
+                'artisans', COALESCE(
+                    (SELECT jsonb_agg(
+                        jsonb_build_object(
+                            'id', p.id,
+                            'full_name', p.full_name,
+                            'email', p.email,
+                            'phone_number', p.phone_number,
+                            'user_type', p.user_type,
+                            'location', p.location,
+                            'created_at', {_json_utc('p.created_at')},
+                            'updated_at', {_json_utc('p.updated_at')},
+                            'artisan_details', CASE WHEN p.details_user_id IS NULL THEN NULL ELSE jsonb_build_object(
+                                'user_id', p.details_user_id,
+                                'bio', p.bio,
+                                'years_experience', p.years_experience,
+                                'average_rating', {_json_float('p.average_rating')},
+                                'total_reviews', p.total_reviews,
+                                'is_available', p.is_available,
+                                'skills', to_jsonb(p.skill_names),
+                                'created_at', {_json_utc('p.details_created_at')},
+                                'updated_at', {_json_utc('p.details_updated_at')}
+                            ) END,
+                            'skills', to_jsonb(p.skill_names)
+                        ) ORDER BY p.created_at DESC, p.id DESC
+                    ) FROM profiles p),
+                    '[]'::jsonb
+                ),
+                'total_count', (SELECT total_count FROM total),
+                'page', %s,
+                'size', %s,
+                -- Only a full page can have a next one
+                'next_cursor', CASE WHEN (SELECT COUNT(*) FROM page) = %s THEN (
+                    SELECT (EXTRACT(EPOCH FROM (p.created_at - TIMESTAMPTZ 'epoch')) * 1000000)::bigint || '.' || p.id
+                    FROM page p
+                    ORDER BY p.created_at, p.id
+                    LIMIT 1
+                ) END
+            )::text,
+            (SELECT total_count FROM total);
+        """
+        # Filters (+ keyset) for the page, pagination, cached total, filters again for the
+        # fallback count, then page/size for the document and size for next_cursor
+        final_params = page_params + [size, offset, cached_total] + query_params + [page, size, size]
+
+        db_cursor.execute(final_query, final_params)
+        body, total_count = db_cursor.fetchone()
+
+        with _artisans_cache_lock:
+            _artisans_total_cache.pop(filters_key, None) # Re-insert so dict order tracks age
+            _artisans_total_cache[filters_key] = (time.monotonic(), total_count)
+            while len(_artisans_total_cache) > _ARTISANS_CACHE_MAX_ENTRIES:
+                del _artisans_total_cache[next(iter(_artisans_total_cache))]
+            _artisans_cache.pop(cache_key, None) # Re-insert so dict order tracks age
+            _artisans_cache[cache_key] = (time.monotonic(), body)
+            while len(_artisans_cache) > _ARTISANS_CACHE_MAX_ENTRIES:
+                del _artisans_cache[next(iter(_artisans_cache))]
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise # Re-raise HTTP exceptions
     except Exception as e:
         print(f"Error fetching artisans: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching artisans")
-    finally:
-        if conn:
-            put_db_connection(conn)
+
+# User, artisan details and skills in one round-trip. Run as a prepared statement: it backs
+# both the profile page and the response of PUT /me, so it is parsed and planned once per
+# pooled connection.
+_ARTISAN_BY_ID_SQL = """
+    SELECT
+        u.id, u.full_name, u.email, u.phone_number, u.user_type, u.location, u.created_at, u.updated_at,
+        ad.user_id, ad.bio, ad.years_experience, ad.average_rating::float8, ad.total_reviews, ad.is_available,
+        ad.created_at, ad.updated_at,
+        COALESCE(ARRAY_AGG(s.name ORDER BY s.name) FILTER (WHERE s.name IS NOT NULL), '{}') AS skill_names
+    FROM users u
+    LEFT JOIN artisan_details ad ON u.id = ad.user_id
+    LEFT JOIN artisan_skills ass ON u.id = ass.artisan_id
+    LEFT JOIN skills s ON ass.skill_id = s.id
+    WHERE u.id = $1
+    GROUP BY u.id, ad.user_id
+"""
+
+def _artisan_profile_from_row(row):
+    (user_id, full_name, email, phone_number, user_type, location, created_at, updated_at,
+     details_user_id, bio, years_experience, average_rating, total_reviews, is_available,
+     details_created_at, details_updated_at, skills_list) = row
+
+    # Values come straight from the database, so build the models without re-validating
+    # them here; FastAPI still checks the result against response_model on the way out.
+    artisan_details = None
+    if details_user_id is not None:
+        artisan_details = ArtisanDetails.model_construct(
+            user_id=details_user_id,
+            bio=bio,
+            years_experience=years_experience,
+            average_rating=average_rating,
+            total_reviews=total_reviews,
+            is_available=is_available,
+            skills=skills_list,
+            created_at=details_created_at,
+            updated_at=details_updated_at
+        )
+
+    return UserProfile.model_construct(
+        id=user_id,
+        full_name=full_name,
+        email=email,
+        phone_number=phone_number,
+        user_type=user_type,
+        location=location,
+        created_at=created_at,
+        updated_at=updated_at,
+        artisan_details=artisan_details,
+        skills=skills_list
+    )
 
 @router.get("/{artisan_id}", response_model=UserProfile) # Path parameter: artisan_id
-async def get_artisan_by_id(artisan_id: int):
-    conn = None
+def get_artisan_by_id(artisan_id: int, conn = Depends(get_db_connection)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
-        # First, fetch basic user data and ensure they are an artisan
-        cursor.execute(
-            "SELECT id, full_name, email, phone_number, user_type, location FROM users WHERE id = %s",
-            (artisan_id,)
-        )
-        user_row = cursor.fetchone()
+        execute_prepared(cursor, "artisan_by_id", _ARTISAN_BY_ID_SQL, (artisan_id,))
+        row = cursor.fetchone()
 
-        if user_row is None:
+        if row is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
         # Check if the user is actually an artisan
-        if user_row[4] != 'artisan': # user_type is at index 4
+        if row[4] != 'artisan':
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not an artisan")
 
-        user_base = UserBase(
-            id=user_row[0],
-            full_name=user_row[1],
-            email=user_row[2],
-            phone_number=user_row[3],
-            user_type=user_row[4],
-            location=user_row[5]
-        )
-
-        artisan_details = None
-        skills_list = []
-
-        # Fetch artisan details
-        cursor.execute(
-            """
-            SELECT bio, years_experience, average_rating, total_reviews, is_available
-            FROM artisan_details WHERE user_id = %s
-            """,
-            (artisan_id,)
-        )
-        artisan_row = cursor.fetchone()
-        if artisan_row:
-            artisan_details = ArtisanDetails(
-                bio=artisan_row[0],
-                years_experience=artisan_row[1],
-                average_rating=artisan_row[2],
-                total_reviews=artisan_row[3],
-                is_available=artisan_row[4]
-            )
-
-        # Fetch skills
-        cursor.execute(
-            """
-            SELECT s.name FROM skills s
-            JOIN artisan_skills ass ON s.id = ass.skill_id
-            WHERE ass.artisan_id = %s
-            ORDER BY s.name
-            """,
-            (artisan_id,)
-        )
-        skill_rows = cursor.fetchall()
-        skills_list = [skill[0] for skill in skill_rows]
-
-        # Construct the UserProfile response
-        user_profile_data = user_base.model_dump() # Pydantic V2 method
-        user_profile_data["artisan_details"] = artisan_details
-        user_profile_data["skills"] = skills_list
-
-        return UserProfile(**user_profile_data)
+        return _artisan_profile_from_row(row)
 
     except HTTPException:
         raise # Re-raise HTTP exceptions
     except Exception as e:
         print(f"Error fetching artisan profile by ID {artisan_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching artisan profile")
-    finally:
-        if conn:
-            put_db_connection(conn)
+
+def _write_artisan_profile(cursor, user_id, artisan_details_update, skill_ids):
+    """
+    Applies a profile update and returns the artisan_details columns plus current skill names,
+    in the column order _artisan_profile_from_row expects after the user fields.
+    Runs inside the caller's transaction.
+    """
+    # Update artisan_skills first, so the upsert's RETURNING below already sees the new set
+    if skill_ids is not None:
+        merge_artisan_skills(cursor, user_id, skill_ids)
+
+    # Update artisan_details (UPSERT logic)
+    # A single atomic upsert: fields the user didn't send are passed as NULL and
+    # COALESCE keeps the stored value for them. RETURNING hands back the stored row and
+    # skills, so the response needs no separate re-select.
+    execute_prepared(cursor, "artisan_details_upsert",
+        """
+        INSERT INTO artisan_details (user_id, bio, years_experience)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (user_id) DO UPDATE SET
+            bio = COALESCE(EXCLUDED.bio, artisan_details.bio),
+            years_experience = COALESCE(EXCLUDED.years_experience, artisan_details.years_experience),
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING
+            user_id, bio, years_experience, average_rating::float8, total_reviews, is_available,
+            created_at, updated_at,
+            ARRAY(
+                SELECT s.name
+                FROM artisan_skills ass
+                JOIN skills s ON ass.skill_id = s.id
+                WHERE ass.artisan_id = $1
+                ORDER BY s.name
+            )
+        """,
+        (user_id, artisan_details_update.bio, artisan_details_update.years_experience)
+    )
+    return cursor.fetchone()
 
 @router.put("/me", response_model=UserProfile)
-async def update_my_artisan_profile(
+def update_my_artisan_profile(
     artisan_details_update: ArtisanDetailsUpdate,
-    current_user: UserBase = Depends(get_current_user)
+    current_user: UserBase = Depends(get_current_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # 1. Authorization Check: Only Artisans can update their artisan profile
         if current_user.user_type != UserType.artisan:
             raise HTTPException(
@@ -245,187 +369,101 @@ async def update_my_artisan_profile(
                 detail="Only artisans can update their artisan profile."
             )
 
-        # 2. Update artisan_details (UPSERT logic)
-        update_fields = []
-        update_values = []
-
-        if artisan_details_update.bio is not None:
-            update_fields.append("bio = %s")
-            update_values.append(artisan_details_update.bio)
-        if artisan_details_update.years_experience is not None:
-            update_fields.append("years_experience = %s")
-            update_values.append(artisan_details_update.years_experience)
-
-        if update_fields:
-            # Build UPSERT query for artisan_details table
-            # Check if artisan_details already exists for this user_id
-            cursor.execute("SELECT user_id FROM artisan_details WHERE user_id = %s", (current_user.id,))
-            existing_details = cursor.fetchone()
-
-            if existing_details:
-                # Update existing details
-                update_values.append(current_user.id)
-                query = f"UPDATE artisan_details SET {', '.join(update_fields)}, updated_at = CURRENT_TIMESTAMP WHERE user_id = %s;"
-                cursor.execute(query, update_values)
-            else:
-                # Insert new details if they don't exist
-                # This means we need the user_id for insert, plus potentially bio and years_experience
-                insert_fields = ["user_id"]
-                insert_placeholders = ["%s"]
-                insert_values = [current_user.id]
-
-                if artisan_details_update.bio is not None:
-                    insert_fields.append("bio")
-                    insert_placeholders.append("%s")
-                    insert_values.append(artisan_details_update.bio)
-                if artisan_details_update.years_experience is not None:
-                    insert_fields.append("years_experience")
-                    insert_placeholders.append("%s")
-                    insert_values.append(artisan_details_update.years_experience)
-
-                if len(insert_fields) > 1: # If at least one detail is provided besides user_id
-                    query = f"INSERT INTO artisan_details ({', '.join(insert_fields)}) VALUES ({', '.join(insert_placeholders)});"
-                    cursor.execute(query, insert_values)
-
-
-        # 3. Update artisan_skills (Delete existing, then re-insert new ones)
+        # 2. Resolve every requested skill name through the in-process skill cache, and reject
+        # unknown names before anything is written
+        skill_ids = None
         if artisan_details_update.skills is not None:
-            # First, delete all existing skills for this artisan
-            cursor.execute("DELETE FROM artisan_skills WHERE artisan_id = %s", (current_user.id,))
-
-            # Then, insert the new skills
+            skill_ids_by_name = {}
             if artisan_details_update.skills:
-                found_skill_ids = []
-                invalid_skills = []
-
-                for skill_name in artisan_details_update.skills:
-                    cursor.execute("SELECT id FROM skills WHERE name = %s", (skill_name,))
-                    skill_row = cursor.fetchone()
-                    if skill_row:
-                        found_skill_ids.append(skill_row[0])
-                    else:
-                        invalid_skills.append(skill_name)
+                skill_ids_by_name, invalid_skills = resolve_skill_ids(conn, artisan_details_update.skills)
 
                 if invalid_skills:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail=f"The following skills are not recognized: {', '.join(invalid_skills)}. Please choose from available skills."
                     )
-
-                # Use execute_values for batch insertion
-                artisan_skill_values = [(current_user.id, skill_id) for skill_id in found_skill_ids]
-                execute_values(cursor,
-                    "INSERT INTO artisan_skills (artisan_id, skill_id) VALUES %s",
-                    artisan_skill_values
-                )
-
-        conn.commit()
-
-        # 4. Fetch and return the complete updated ArtisanProfileResponse
-        # Re-use logic from get_artisan_by_id or construct it fully
-        cursor.execute(
-            """
-            SELECT
-                u.id, u.full_name, u.email, u.phone_number, u.location, u.user_type, u.created_at,
-                ad.bio, ad.years_experience,
-                ARRAY_AGG(s.name ORDER BY s.name) AS skill_names
-            FROM users u
-            LEFT JOIN artisan_details ad ON u.id = ad.user_id
-            LEFT JOIN artisan_skills ars ON u.id = ars.artisan_id
-            LEFT JOIN skills s ON ars.skill_id = s.id
-            WHERE u.id = %s
-            GROUP BY u.id, u.full_name, u.email, u.phone_number, u.location, u.user_type, u.created_at, ad.bio, ad.years_experience;
-            """,
-            (current_user.id,)
-        )
-        artisan_row = cursor.fetchone()
-
-        if artisan_row is None: # Should not happen if current_user is valid
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve updated artisan data.")
-
-        (user_id, full_name, email, phone_number, location, user_type_str, created_at,
-         bio, years_experience, skill_names_array) = artisan_row
-
-        parsed_skills = [s for s in (skill_names_array if skill_names_array else []) if s is not None]
-
-        return UserProfile(
-            id=user_id,
-            full_name=full_name,
-            email=email,
-            phone_number=phone_number,
-            location=location,
-            user_type=UserType(user_type_str),
-            created_at=created_at,
-            artisan_details=ArtisanDetails(
-                bio=bio,
-                years_experience=years_experience,
-                # average_rating, total_reviews, is_available are not handled in this update,
-                # so they will be None or default as per schema
-            ),
-            skills=parsed_skills
-        )
+            skill_ids = list(skill_ids_by_name.values())
+
+        # 3. Write in one REPEATABLE READ transaction, so the returned profile is exactly what
+        # this request committed even if another update to the same artisan races it.
+        # A concurrent writer makes Postgres abort with a serialization failure; retry that once.
+        for attempt in range(2):
+            try:
+                with transaction(conn, isolation_level="REPEATABLE READ"):
+                    details_row = _write_artisan_profile(conn.cursor(), current_user.id, artisan_details_update, skill_ids)
+                break
+            except SerializationFailure:
+                if attempt:
+                    raise
+                print(f"Serialization failure updating artisan profile {current_user.id}, retrying")
+
+        invalidate_artisans_cache()
+        invalidate_current_user(current_user.id)
+
+        # The user columns are unchanged by this endpoint, so they come from current_user
+        user_row = (current_user.id, current_user.full_name, current_user.email, current_user.phone_number,
+                    current_user.user_type, current_user.location, current_user.created_at, current_user.updated_at)
+        return _artisan_profile_from_row(user_row + tuple(details_row))
 
     except HTTPException:
-        conn.rollback()
         raise
     except Exception as e:
-        conn.rollback()
         print(f"Error updating artisan profile {current_user.id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update artisan profile due to server error.")
-    finally:
-        if conn:
-            put_db_connection(conn)
 
-@router.get("/{artisan_id}/reviews", response_model=List[ReviewResponse])
-async def get_reviews_for_artisan(
+# Built once at import: encodes the whole review list to JSON in a single call,
+# instead of FastAPI's own response_model pass.
+_REVIEW_LIST_ADAPTER = TypeAdapter(List[ReviewResponse])
+REVIEWS_STREAM_BATCH = 500 # Rows fetched per round-trip from the server-side cursor
+_REVIEW_FIELDS = ("id", "job_id", "client_id", "artisan_id", "rating", "comment", "created_at", "updated_at")
+
+@router.get("/{artisan_id}/reviews", response_model=None, response_class=Response, responses={200: {"model": List[ReviewResponse], "content": {"application/json": {}}}})
+def get_reviews_for_artisan(
     artisan_id: int,
-    current_user: UserBase = Depends(get_current_user) # Authentication is still required
+    current_user: UserBase = Depends(get_current_user), # Authentication is still required
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Optional: Check if artisan_id exists and is actually an artisan
-        cursor.execute("SELECT user_type FROM users WHERE id = %s", (artisan_id,))
-        user_type_row = cursor.fetchone()
-        if not user_type_row or UserType(user_type_row[0]) != UserType.artisan:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artisan not found.")
-
-        cursor.execute(
-            "SELECT id, job_id, client_id, artisan_id, rating, comment, created_at, updated_at FROM job_reviews WHERE artisan_id = %s ORDER BY created_at DESC",
-            (artisan_id,)
-        )
-        review_rows = cursor.fetchall()
-
-        reviews_list = []
-        for row in review_rows:
-            (id, job_id, client_id, reviewed_artisan_id, rating, comment, created_at, updated_at) = row
-            reviews_list.append(
-                ReviewResponse(
-                    id=id, job_id=job_id, client_id=client_id, artisan_id=reviewed_artisan_id,
-                    rating=rating, comment=comment, created_at=created_at, updated_at=updated_at
+        # The artisan check rides along with the reviews query; only an empty result needs
+        # a second look to tell "no reviews yet" apart from "no such artisan".
+        # The list isn't paginated, so rows are pulled through a server-side cursor in batches
+        # and turned into ReviewResponse objects as they arrive, without a fetchall() copy.
+        with transaction(conn):
+            with conn.cursor(name="artisan_reviews_cur") as stream:
+                stream.itersize = REVIEWS_STREAM_BATCH
+                stream.execute(
+                    """
+                    SELECT r.id, r.job_id, r.client_id, r.artisan_id, r.rating, r.comment, r.created_at, r.updated_at
+                    FROM job_reviews r
+                    JOIN users u ON u.id = r.artisan_id AND u.user_type = 'artisan'
+                    WHERE r.artisan_id = %s
+                    ORDER BY r.created_at DESC
+                    """,
+                    (artisan_id,)
                 )
-            )
-        return reviews_list
+                # Trusted rows from our own table, so no per-field validation
+                reviews_list = [ReviewResponse.model_construct(**dict(zip(_REVIEW_FIELDS, row))) for row in stream]
+            if not reviews_list:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM users WHERE id = %s AND user_type = 'artisan'", (artisan_id,))
+                    if cursor.fetchone() is None:
+                        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artisan not found.")
+
+        return Response(content=_REVIEW_LIST_ADAPTER.dump_json(reviews_list), media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching reviews for artisan {artisan_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error fetching reviews.")
-    finally:
-        if conn:
-            put_db_connection(conn) 
 
 @router.put("/me/availability", response_model=ArtisanDetails)
-async def update_my_availability(
+def update_my_availability(
     is_available: bool, # Directly receive the boolean status
-    current_user: UserBase = Depends(get_current_user)
+    current_user: UserBase = Depends(get_current_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         # 1. Authorization: Ensure the current user is an artisan
@@ -453,6 +491,8 @@ async def update_my_availability(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artisan details not found for current user.")
 
         conn.commit()
+        invalidate_artisans_cache()
+        invalidate_current_user(current_user.id)
 
         # 3. Return the updated ArtisanDetails
         return ArtisanDetails(**updated_details)
@@ -464,6 +504,3 @@ async def update_my_availability(
         if conn: conn.rollback()
         print(f"Error updating availability for artisan {current_user.id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error updating availability.")
-    finally:
-        if conn:
-            put_db_connection(conn)
\ No newline at end of file
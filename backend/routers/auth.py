@@ -1,5 +1,11 @@
 from typing import Optional, List, Any
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.concurrency import run_in_threadpool
 # Explicitly import all necessary schemas for clarity
 from backend.schemas import (
     RegisterUser, LoginUser, UserBase, ArtisanDetails, UserProfile,
@@ -10,19 +16,39 @@ from backend.schemas import (
     ClientForApplicationResponse, ArtisanApplicationDetails, ApplicationStatusUpdate,
     ArtisanApplicationListResponse # Added any missing schemas from your file
 )
-from backend.database import get_db_connection, put_db_connection # Import DB utilities
+from backend.database import db_connection, get_db_connection, put_db_connection, execute_prepared, transaction # Import DB utilities
+from backend.routers.skill import ensure_skill_ids
 import os
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext # For password hashing
-from jose import JWTError, jwt # For JWT handling
+from argon2 import PasswordHasher, Type as Argon2Type # For password hashing
+from argon2.exceptions import InvalidHashError, VerificationError
+import bcrypt
+import jwt # PyJWT, for JWT handling
+from jwt import PyJWTError
 from datetime import datetime, timedelta, timezone # For token expiration
-from psycopg2.extras import RealDictCursor, execute_values # Make sure execute_values is here
+from psycopg2.errors import UniqueViolation
+from psycopg2.extras import RealDictCursor
 
 # OAuth2 scheme for JWT token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
-# Password hashing context (bcrypt)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. New hashes are argon2id (OWASP's minimum profile: 19 MiB, 2 passes, 1 lane);
+# older bcrypt hashes still verify and are re-hashed on login. Both libraries are called
+# directly: they are thin wrappers over the C implementations, without passlib's per-call
+# scheme detection and dispatch on top.
+_argon2_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1, type=Argon2Type.ID)
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+# Checked against when the email is unknown, so a failed login costs one hash either way and
+# response times don't reveal which emails are registered
+_DUMMY_PASSWORD_HASH = _argon2_hasher.hash("not-a-real-password")
+
+# Password hashing is deliberately slow CPU work (tens of ms). The async register/login
+# handlers run it on this dedicated pool so the event loop stays free, and a burst of logins
+# can't take over the threads FastAPI uses for sync handlers and DB work. Sized to cores, not
+# requests (the hash releases the GIL, so more threads than cores only adds contention);
+# override with PASSWORD_HASH_WORKERS.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+_password_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 # JWT Secret and Algorithm (from .env)
 SECRET_KEY = os.getenv("JWT_SECRET")
@@ -34,83 +60,168 @@ router = APIRouter(
     tags=["Auth"]
 )
 
+ACCESS_TOKEN_TTL = timedelta(minutes=60)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=60)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    payload = {**data, "exp": datetime.now(timezone.utc) + (expires_delta or ACCESS_TOKEN_TTL)}
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    try:
+        return _argon2_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _argon2_hasher.hash(password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    """Returns (is_valid, new_hash); new_hash is set when the stored hash is bcrypt or uses outdated argon2 settings."""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if hashed_password.startswith(_BCRYPT_PREFIXES) or _argon2_hasher.check_needs_rehash(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await asyncio.get_running_loop().run_in_executor(_password_hash_pool, verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await asyncio.get_running_loop().run_in_executor(_password_hash_pool, get_password_hash, password)
+
+# users + artisan_details + skills in one round-trip, for the login response and get_current_user.
+# Append a WHERE clause on `u`; both callers run it as a prepared statement since it is on the
+# path of every authenticated request. Non-artisans simply get NULL details and an empty skills array.
+_USER_PROFILE_SELECT = """
+    SELECT
+        u.id, u.full_name, u.email, u.phone_number, u.password_hash, u.user_type, u.location,
+        u.created_at, u.updated_at,
+        ad.user_id AS details_user_id, ad.bio, ad.years_experience, ad.average_rating::float8 AS average_rating, ad.total_reviews,
+        ad.is_available, ad.created_at AS details_created_at, ad.updated_at AS details_updated_at,
+        ARRAY(
+            SELECT s.name
+            FROM artisan_skills AS ASkills
+            JOIN skills AS s ON ASkills.skill_id = s.id
+            WHERE ASkills.artisan_id = u.id
+        ) AS skills
+    FROM users u
+    LEFT JOIN artisan_details ad ON ad.user_id = u.id
+"""
+
+def _user_profile_from_row(row) -> UserProfile:
+    artisan_details_instance = None
+    current_skills = []
+    if row['user_type'] == UserType.artisan:
+        current_skills = row['skills']
+        if row['details_user_id'] is not None:
+            artisan_details_instance = ArtisanDetails.model_construct(
+                user_id=row['details_user_id'],
+                bio=row['bio'],
+                years_experience=row['years_experience'],
+                average_rating=row['average_rating'],
+                total_reviews=row['total_reviews'],
+                is_available=row['is_available'],
+                skills=current_skills,
+                created_at=row['details_created_at'],
+                updated_at=row['details_updated_at']
+            )
 
-@router.post("/register", status_code=status.HTTP_201_CREATED, response_model=dict) # Response model can be a dict for simplicity here
-async def register_user(user_data: RegisterUser, db: Any = Depends(get_db_connection)):
-    conn = db # Use the injected connection
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor) # Use RealDictCursor
+    # Rows come straight from our own tables, so skip re-validating them. This runs on
+    # every authenticated request via get_current_user.
+    return UserProfile.model_construct(
+        id=row['id'],
+        full_name=row['full_name'],
+        email=row['email'],
+        phone_number=row['phone_number'],
+        user_type=row['user_type'],
+        location=row['location'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        artisan_details=artisan_details_instance,
+        skills=current_skills
+    )
 
-        cursor.execute("SELECT id FROM users WHERE email = %s OR phone_number = %s", (user_data.email, user_data.phone_number))
-        if cursor.fetchone():
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email or phone number already exists")
+# Registration in one statement: the user row, then (for artisans) the details row and skill
+# links, all keyed off the id the first INSERT returns. ON CONFLICT DO NOTHING covers both the
+# email and phone_number unique constraints, so a duplicate comes back as no row instead of an
+# error. Skill ids travel as one int[] parameter, so the text is the same for any number of
+# skills and is prepared once per connection.
+_REGISTER_USER_SQL = """
+    WITH new_user AS (
+        INSERT INTO users (full_name, email, phone_number, password_hash, user_type, location, created_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $7)
+        ON CONFLICT DO NOTHING
+        RETURNING id, full_name, email, phone_number, user_type, location, created_at, updated_at
+    ),
+    details AS (
+        INSERT INTO artisan_details (user_id, bio, years_experience, created_at, updated_at)
+        SELECT id, $8, $9, $7, $7 FROM new_user WHERE user_type = 'artisan'
+    ),
+    linked_skills AS (
+        INSERT INTO artisan_skills (artisan_id, skill_id)
+        SELECT new_user.id, skill_id FROM new_user, unnest($10::int[]) AS skill_id
+        WHERE new_user.user_type = 'artisan'
+        ON CONFLICT DO NOTHING
+    )
+    SELECT * FROM new_user
+"""
 
-        hashed_password = get_password_hash(user_data.password)
-        current_utc_time = datetime.now(timezone.utc)
+# Blocking DB work for the async register/login handlers. Each helper borrows its own pooled
+# connection and is run via run_in_threadpool, so psycopg2 never blocks the event loop.
+def _insert_new_user(user_data: RegisterUser, hashed_password: str, created_at: datetime):
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor) # Use RealDictCursor
 
-        cursor.execute(
-            """
-            INSERT INTO users (full_name, email, phone_number, password_hash, user_type, location, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, full_name, email, phone_number, user_type, location, created_at, updated_at
-            """,
-            (user_data.full_name, user_data.email, user_data.phone_number, hashed_password,
-             user_data.user_type, user_data.location, current_utc_time, current_utc_time)
-        )
-        new_user_data = cursor.fetchone() # This will be a dict from RealDictCursor
-        user_id = new_user_data['id']
+        # One transaction, so skill names created for this signup don't outlive a rejected user
+        with transaction(conn):
+            skill_ids = []
+            if user_data.user_type == UserType.artisan:
+                # Existing skills resolve from the cache, unknown ones are created in one statement
+                skill_ids = ensure_skill_ids(conn, user_data.skills)
+
+            execute_prepared(cursor, "register_user", _REGISTER_USER_SQL, (
+                user_data.full_name, user_data.email, user_data.phone_number, hashed_password,
+                user_data.user_type, user_data.location, created_at,
+                user_data.bio, user_data.years_experience or 0, skill_ids
+            ))
+            new_user = cursor.fetchone()
+            if new_user is None:
+                # Email or phone number is taken: discard any skills inserted above
+                conn.rollback()
+        return new_user
+
+def _fetch_login_row(email: str):
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        execute_prepared(cursor, "user_profile_by_email", _USER_PROFILE_SELECT + " WHERE u.email = $1", (email,))
+        return cursor.fetchone()
 
-        if user_data.user_type == UserType.artisan: # Corrected from 'artisan' string literal
-            if not user_data.bio or not user_data.skills:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Artisan registration requires bio and skills.")
+def _store_password_hash(user_id: int, password_hash: str):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
 
-            cursor.execute(
-                """
-                INSERT INTO artisan_details (user_id, bio, years_experience, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (user_id, user_data.bio, user_data.years_experience or 0, current_utc_time, current_utc_time)
-            )
+@router.post("/register", status_code=status.HTTP_201_CREATED, response_model=dict) # Response model can be a dict for simplicity here
+async def register_user(user_data: RegisterUser):
+    # Borrows a pooled connection only around its queries (see _insert_new_user) rather than
+    # via Depends(get_db_connection), which would hold it through the password hash and the
+    # response serialization as well.
+    try:
+        if user_data.user_type == UserType.artisan and (not user_data.bio or not user_data.skills):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Artisan registration requires bio and skills.")
 
-            if user_data.skills:
-                skill_ids = []
-                for skill_name in user_data.skills:
-                    # Use ON CONFLICT DO UPDATE to ensure idempotency if skill exists
-                    cursor.execute(
-                        "INSERT INTO skills (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id",
-                        (skill_name,)
-                    )
-                    skill_row = cursor.fetchone()
-                    skill_ids.append(skill_row['id'])
-
-                if skill_ids:
-                    artisan_skills_values = [(user_id, skill_id) for skill_id in skill_ids]
-                    execute_values(cursor,
-                        "INSERT INTO artisan_skills (artisan_id, skill_id) VALUES %s",
-                        artisan_skills_values
-                    )
+        hashed_password = await get_password_hash_async(user_data.password)
+        current_utc_time = datetime.now(timezone.utc)
 
-        conn.commit()
+        new_user_data = await run_in_threadpool(_insert_new_user, user_data, hashed_password, current_utc_time)
+        if new_user_data is None: # ON CONFLICT: the email or phone number is taken
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email or phone number already exists")
+        user_id = new_user_data['id']
 
-        access_token_expires = timedelta(minutes=60)
         access_token = create_access_token(
-            data={"user_id": user_id, "user_type": user_data.user_type, "email": user_data.email},
-            expires_delta=access_token_expires
+            data={"user_id": user_id, "user_type": user_data.user_type, "email": user_data.email}
         )
 
         # Construct UserProfile for response (using the dict from new_user_data)
@@ -123,77 +234,46 @@ async def register_user(user_data: RegisterUser, db: Any = Depends(get_db_connec
         return {
             "msg": "User registered successfully!",
             "token": access_token,
-            "user": response_user_profile.model_dump() # Convert to dict
+            "user": response_user_profile # Serialized by FastAPI along with the rest of the response
         }
 
     except HTTPException:
-        conn.rollback()
         raise
     except Exception as e:
-        conn.rollback()
         print(f"Error during registration: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error during registration")
-    finally:
-        # FastAPI's Depends(get_db_connection) handles putting the connection back.
-        pass
 
 @router.options("/login")
 async def options_login():
     return {}
 
 @router.post("/login", response_model=dict) # Updated response model
-async def login_for_access_token(form_data: LoginUser, db: Any = Depends(get_db_connection)):
-    conn = db # Use the injected connection
+async def login_for_access_token(form_data: LoginUser):
+    # Like register, the connection goes back to the pool before the password check
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        user_data = await run_in_threadpool(_fetch_login_row, form_data.email)
 
-        cursor.execute(
-            "SELECT id, full_name, email, phone_number, password_hash, user_type, location, created_at, updated_at FROM users WHERE email = %s",
-            (form_data.email,)
-        )
-        user_data = cursor.fetchone()
-
-        if not user_data or not verify_password(form_data.password, user_data["password_hash"]):
+        if not user_data:
+            await verify_and_update_password_async(form_data.password, _DUMMY_PASSWORD_HASH)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Credentials")
+        password_ok, new_hash = await verify_and_update_password_async(form_data.password, user_data["password_hash"])
+        if not password_ok:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Credentials")
+        if new_hash:
+            # Migrate old bcrypt hashes to argon2id now that we have the plain password
+            await run_in_threadpool(_store_password_hash, user_data["id"], new_hash)
 
-        access_token_expires = timedelta(minutes=60)
         access_token = create_access_token(
-            data={"user_id": user_data["id"], "user_type": user_data["user_type"], "email": user_data["email"]},
-            expires_delta=access_token_expires
+            data={"user_id": user_data["id"], "user_type": user_data["user_type"], "email": user_data["email"]}
         )
 
-        # Construct UserProfile for login response, including artisan details if applicable
-        artisan_details_instance = None
-        current_skills = []
-
-        if user_data['user_type'] == UserType.artisan:
-            cursor.execute("SELECT * FROM artisan_details WHERE user_id = %s", (user_data['id'],))
-            artisan_details_data = cursor.fetchone()
-
-            cursor.execute("""
-                SELECT s.name
-                FROM artisan_skills AS ASkills
-                JOIN skills AS s ON ASkills.skill_id = s.id
-                WHERE ASkills.artisan_id = %s
-            """, (user_data['id'],))
-            current_skills = [row['name'] for row in cursor.fetchall()]
-
-            if artisan_details_data:
-                artisan_details_instance = ArtisanDetails(
-                    **artisan_details_data, # Unpack all fields directly
-                    skills=current_skills
-                )
-
-        response_user_profile = UserProfile(
-            **user_data, # Unpack all fields directly
-            artisan_details=artisan_details_instance,
-            skills=current_skills # Assign skills here
-        )
+        # UserProfile for the login response, including artisan details if applicable
+        response_user_profile = _user_profile_from_row(user_data)
 
         return {
             "msg": "Logged in successfully!",
             "token": access_token,
-            "user": response_user_profile.model_dump()
+            "user": response_user_profile
         }
 
     except HTTPException:
@@ -201,78 +281,143 @@ async def login_for_access_token(form_data: LoginUser, db: Any = Depends(get_db_
     except Exception as e:
         print(f"Error during login: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error during login")
-    finally:
-        # FastAPI's Depends(get_db_connection) handles putting the connection back.
-        pass
+
+# --- Short-lived cache of authenticated users ---
+# get_current_user runs on every protected request. Keyed by a 16-byte BLAKE2b digest of the
+# token (so a different token never matches, and long tokens don't pin memory) and kept for
+# CURRENT_USER_CACHE_TTL seconds; the profile endpoints call invalidate_current_user() so a
+# user's own edits show up immediately.
+CURRENT_USER_CACHE_TTL = 30 # Seconds
+_CURRENT_USER_CACHE_MAX_ENTRIES = 10000 # Oldest entries are evicted first beyond this
+
+_current_user_cache = {} # token digest -> (expires_at, user_id, UserProfile)
+_current_user_keys = {} # user_id -> set of token digests, so invalidation doesn't scan the cache
+_current_user_cache_lock = threading.Lock()
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _drop_cached_token(key: bytes):
+    # Caller holds _current_user_cache_lock
+    entry = _current_user_cache.pop(key, None)
+    if entry:
+        keys = _current_user_keys.get(entry[1])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del _current_user_keys[entry[1]]
+
+def invalidate_current_user(user_id: int):
+    """Drops every cached profile for `user_id`."""
+    with _current_user_cache_lock:
+        for key in _current_user_keys.pop(user_id, ()):
+            _current_user_cache.pop(key, None)
 
 # This function will be used as a dependency to protect routes
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Any = Depends(get_db_connection)):
+def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    conn = db # Use the injected connection
     try:
+        # Checked before jwt.decode: an entry only exists for a token that already passed
+        # verification, and never outlives the token's `exp`, so a hit skips the signature
+        # check and JSON parse as well as the query.
+        now = time.monotonic()
+        cache_key = _token_cache_key(token)
+        with _current_user_cache_lock:
+            cached = _current_user_cache.get(cache_key)
+        if cached and now < cached[0]:
+            return cached[2]
+
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("user_id")
         if user_id is None:
             raise credentials_exception
 
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Fetch basic user data including created_at and updated_at
-        cursor.execute(
-            "SELECT id, full_name, email, phone_number, user_type, location, created_at, updated_at FROM users WHERE id = %s",
-            (user_id,)
-        )
-        user_data = cursor.fetchone()
+        # Only a cache miss needs the database, so the connection is borrowed here instead of
+        # through Depends(get_db_connection), which would check one out for every request.
+        # Protected handlers list current_user before their own connection, so this one is
+        # back in the pool before theirs is taken.
+        with db_connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            execute_prepared(cursor, "user_profile_by_id", _USER_PROFILE_SELECT + " WHERE u.id = $1", (user_id,))
+            user_data = cursor.fetchone()
         if user_data is None:
             raise credentials_exception
 
-        artisan_details_instance = None
-        current_skills = []
-
-        if user_data['user_type'] == UserType.artisan:
-            cursor.execute("SELECT * FROM artisan_details WHERE user_id = %s", (user_id,))
-            artisan_details_data = cursor.fetchone()
-
-            cursor.execute("""
-                SELECT s.name
-                FROM artisan_skills AS ASkills
-                JOIN skills AS s ON ASkills.skill_id = s.id
-                WHERE ASkills.artisan_id = %s
-            """, (user_id,))
-            current_skills = [row['name'] for row in cursor.fetchall()]
-
-            if artisan_details_data:
-                artisan_details_instance = ArtisanDetails(
-                    **artisan_details_data, # Unpack all fields directly
-                    skills=current_skills
-                )
-
-        return UserProfile(
-            **user_data, # Unpack all fields directly
-            artisan_details=artisan_details_instance,
-            skills=current_skills
-        )
+        user_profile = _user_profile_from_row(user_data)
+
+        # Never keep an entry past the token's own expiry (jwt.decode has checked `exp`);
+        # tokens about to expire aren't worth caching at all
+        expires_at = now + CURRENT_USER_CACHE_TTL
+        if "exp" in payload:
+            expires_at = min(expires_at, now + payload["exp"] - time.time())
+        if expires_at - now > 5:
+            with _current_user_cache_lock:
+                _drop_cached_token(cache_key) # Re-insert so dict order tracks age
+                _current_user_cache[cache_key] = (expires_at, user_id, user_profile)
+                _current_user_keys.setdefault(user_id, set()).add(cache_key)
+                while len(_current_user_cache) > _CURRENT_USER_CACHE_MAX_ENTRIES:
+                    _drop_cached_token(next(iter(_current_user_cache)))
 
-    except JWTError:
+        return user_profile
+
+    except PyJWTError:
         raise credentials_exception
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_current_user: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server error during authentication")
-    finally:
-        # FastAPI's Depends(get_db_connection) handles putting the connection back.
-        pass
 
 @router.get("/me", response_model=UserProfile)
 async def read_users_me(current_user: UserProfile = Depends(get_current_user)):
     # get_current_user now returns a fully populated UserProfile, so just return it
     return current_user
 
+# PUT /me in one statement. Each part is switched by a parameter rather than by building the SQL,
+# so the text is fixed and prepared once per connection:
+#   u    - users columns; NULL keeps the stored value, skipped unless $6
+#   ad   - artisan_details upsert, same COALESCE rule; creates the row if missing, skipped unless $10
+#   skills - merge with $11: only dropped links are deleted and new ones inserted; NULL leaves them
+# The delete and insert touch disjoint rows, so they are safe in the same statement.
+_PROFILE_UPDATE_SQL = """
+    WITH u AS (
+        UPDATE users SET
+            full_name = COALESCE($1, full_name),
+            email = COALESCE($2, email),
+            phone_number = COALESCE($3, phone_number),
+            location = COALESCE($4, location),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = $5 AND $6::boolean
+        RETURNING id
+    ), ad AS (
+        INSERT INTO artisan_details (user_id, bio, years_experience, is_available)
+        SELECT $5, $7::text, $8::int, COALESCE($9::boolean, TRUE)
+        WHERE $10::boolean
+        ON CONFLICT (user_id) DO UPDATE SET
+            bio = COALESCE(EXCLUDED.bio, artisan_details.bio),
+            years_experience = COALESCE(EXCLUDED.years_experience, artisan_details.years_experience),
+            is_available = COALESCE($9::boolean, artisan_details.is_available),
+            updated_at = CURRENT_TIMESTAMP
+    ), new_ids AS (
+        SELECT unnest($11::int[]) AS skill_id
+    ), deleted AS (
+        DELETE FROM artisan_skills
+        WHERE artisan_id = $5 AND $11::int[] IS NOT NULL
+          AND skill_id NOT IN (SELECT skill_id FROM new_ids)
+    ), inserted AS (
+        INSERT INTO artisan_skills (artisan_id, skill_id)
+        SELECT $5, skill_id FROM new_ids
+        ON CONFLICT (artisan_id, skill_id) DO NOTHING
+    )
+    SELECT EXISTS (SELECT 1 FROM u) AS updated
+"""
+
 @router.put("/me", response_model=UserProfile)
-async def update_my_profile(
+def update_my_profile(
     profile_update: ProfileUpdate,
     current_user: UserProfile = Depends(get_current_user),
     db: Any = Depends(get_db_connection)
@@ -282,106 +427,47 @@ async def update_my_profile(
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         conn.autocommit = False # Start a transaction
 
-        user_updates = {}
-        if profile_update.full_name is not None:
-            user_updates['full_name'] = profile_update.full_name
-        if profile_update.email is not None:
-            user_updates['email'] = profile_update.email
-        if profile_update.phone_number is not None:
-            user_updates['phone_number'] = profile_update.phone_number
-        if profile_update.location is not None:
-            user_updates['location'] = profile_update.location
-
-        if user_updates:
-            user_updates['updated_at'] = datetime.now(timezone.utc)
-            set_clauses = [f"{key} = %s" for key in user_updates.keys()]
-            query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = %s RETURNING id, full_name, email, phone_number, user_type, location, created_at, updated_at"
-            values = list(user_updates.values()) + [current_user.id]
-            cursor.execute(query, values)
-            updated_user_data = cursor.fetchone()
-            if not updated_user_data:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
-        else:
-            # If no user updates, just get the current user data for the response
-            updated_user_data = current_user.model_dump()
-
+        user_fields = (profile_update.full_name, profile_update.email, profile_update.phone_number, profile_update.location)
+        update_user = any(value is not None for value in user_fields)
 
+        details_update = None
+        skill_ids = None # None leaves the artisan's skills untouched, [] clears them
         if current_user.user_type == UserType.artisan and profile_update.artisan_details:
-            artisan_details_updates = {}
-            if profile_update.artisan_details.bio is not None:
-                artisan_details_updates['bio'] = profile_update.artisan_details.bio
-            if profile_update.artisan_details.years_experience is not None:
-                artisan_details_updates['years_experience'] = profile_update.artisan_details.years_experience
-            if profile_update.artisan_details.is_available is not None:
-                artisan_details_updates['is_available'] = profile_update.artisan_details.is_available
-
-            if artisan_details_updates:
-                artisan_details_updates['updated_at'] = datetime.now(timezone.utc)
-                set_clauses = [f"{key} = %s" for key in artisan_details_updates.keys()]
-                query = f"UPDATE artisan_details SET {', '.join(set_clauses)} WHERE user_id = %s RETURNING *"
-                values = list(artisan_details_updates.values()) + [current_user.id]
-                cursor.execute(query, values)
-                updated_artisan_data = cursor.fetchone()
-                if not updated_artisan_data:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Artisan details not found.")
-            else:
-                cursor.execute("SELECT * FROM artisan_details WHERE user_id = %s", (current_user.id,))
-                updated_artisan_data = cursor.fetchone()
-
-
-            if profile_update.artisan_details.skills is not None:
-                cursor.execute("DELETE FROM artisan_skills WHERE artisan_id = %s", (current_user.id,))
-
-                if profile_update.artisan_details.skills:
-                    new_skill_names = profile_update.artisan_details.skills
-                    skills_to_insert_ids = []
-                    for skill_name in new_skill_names:
-                        cursor.execute(
-                            "INSERT INTO skills (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id",
-                            (skill_name,)
-                        )
-                        skills_to_insert_ids.append(cursor.fetchone()['id'])
-
-                    if skills_to_insert_ids:
-                        insert_values = []
-                        for skill_id in skills_to_insert_ids:
-                            insert_values.append(cursor.mogrify("(%s, %s)", (current_user.id, skill_id)).decode('utf-8'))
-                        
-                        insert_query = "INSERT INTO artisan_skills (artisan_id, skill_id) VALUES " + ",".join(insert_values)
-                        cursor.execute(insert_query)
+            details_update = profile_update.artisan_details
+            if details_update.skills is not None:
+                # Existing skills resolve from the cache, unknown ones are created in one statement
+                skill_ids = ensure_skill_ids(conn, details_update.skills) if details_update.skills else []
+        update_details = details_update is not None and (
+            details_update.bio is not None or details_update.years_experience is not None or details_update.is_available is not None
+        )
 
-        conn.commit()
+        if update_user or update_details or skill_ids is not None:
+            try:
+                execute_prepared(cursor, "user_profile_update", _PROFILE_UPDATE_SQL, user_fields + (
+                    current_user.id, update_user,
+                    details_update.bio if details_update else None,
+                    details_update.years_experience if details_update else None,
+                    details_update.is_available if details_update else None,
+                    update_details, skill_ids
+                ))
+            except UniqueViolation:
+                # The unique constraints on email/phone_number do the duplicate check
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email or phone number already exists")
+            if update_user and not cursor.fetchone()['updated']:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 
-        # Re-fetch the user and artisan details to get the most current state for the response
-        cursor.execute("SELECT * FROM users WHERE id = %s", (current_user.id,))
-        final_user_data_from_db = cursor.fetchone()
-
-        final_artisan_details_instance = None
-        final_skills_list = []
-
-        if final_user_data_from_db and final_user_data_from_db['user_type'] == UserType.artisan:
-            cursor.execute("SELECT * FROM artisan_details WHERE user_id = %s", (current_user.id,))
-            final_artisan_details_from_db = cursor.fetchone()
-
-            cursor.execute("""
-                SELECT s.name
-                FROM artisan_skills AS ASkills
-                JOIN skills AS s ON ASkills.skill_id = s.id
-                WHERE ASkills.artisan_id = %s
-            """, (current_user.id,))
-            final_skills_list = [row['name'] for row in cursor.fetchall()]
-
-            if final_artisan_details_from_db:
-                final_artisan_details_instance = ArtisanDetails(
-                    **final_artisan_details_from_db,
-                    skills=final_skills_list
-                )
-        
-        return UserProfile(
-            **final_user_data_from_db,
-            artisan_details=final_artisan_details_instance,
-            skills=final_skills_list
-        )
+        conn.commit()
+        invalidate_current_user(current_user.id)
+        if current_user.user_type == UserType.artisan:
+            # Location, name, bio and skills all show up in the cached /api/artisans listing.
+            # Imported here because artisan.py imports this module.
+            from backend.routers.artisan import invalidate_artisans_cache
+            invalidate_artisans_cache()
+
+        # Re-fetch the profile for the response: user, artisan details and skills in one
+        # round-trip, same prepared statement get_current_user uses
+        execute_prepared(cursor, "user_profile_by_id", _USER_PROFILE_SELECT + " WHERE u.id = $1", (current_user.id,))
+        return _user_profile_from_row(cursor.fetchone())
 
     except HTTPException:
         conn.rollback()
@@ -8,15 +8,19 @@ import pydicom
 from pydicom.pixel_data_handlers.util import apply_voi_lut
 from PIL import Image
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
 
 
 os.makedirs(output_folder, exist_ok=True)
 
-# === LOOP ===
-for filename in os.listdir(input_folder):
-    if not filename.lower().endswith(".dcm"):
-        continue
-
+# === PER-FILE WORK ===
+# Each file is independent and CPU-bound (decode, VOI LUT, PNG encode), so files are
+# converted in parallel worker processes.
+# PNG compress level: PIL's default is 6; level 1 (--fast) encodes several times faster
+# for 8-bit grayscale frames at the cost of somewhat larger files.
+def convert_one(filename, compress_level=6):
     dicom_path = os.path.join(input_folder, filename)
 
     try:
@@ -25,24 +29,33 @@ for filename in os.listdir(input_folder):
         # Only process Enhanced MR Image Storage
         if dcm.get("SOPClassUID") != "1.2.840.10008.5.1.4.1.1.4.1":
             print(f"Skipping {filename}: Not an Enhanced MR Image")
-            continue
+            return
 
         if "PixelData" not in dcm:
             print(f"Skipping {filename}: No PixelData")
-            continue
+            return
 
         # Read pixel array
         pixel_array = dcm.pixel_array  # shape: (num_frames, height, width)
+        if pixel_array.ndim == 2:
+            pixel_array = pixel_array[np.newaxis]  # Single frame: treat as a 1-frame volume
 
-        # Apply VOI LUT if available
+        # Apply VOI LUT if available (works on the whole volume, no per-frame loop)
         if hasattr(dcm, "VOILUTSequence"):
-            pixel_array = np.array([apply_voi_lut(frame, dcm) for frame in pixel_array])
+            pixel_array = apply_voi_lut(pixel_array, dcm)
 
-        # Normalize and save each frame
-        for idx, frame in enumerate(pixel_array):
-            frame = ((frame - np.min(frame)) / np.ptp(frame) * 255).astype(np.uint8)
+        # Normalize every frame to 0-255 in one vectorized pass over the volume
+        volume = pixel_array.astype(np.float32, copy=False)
+        mn = volume.min(axis=(1, 2), keepdims=True)
+        rng = volume.max(axis=(1, 2), keepdims=True) - mn
+        rng[rng == 0] = 1  # Flat frames come out black instead of dividing by zero
+        frames = ((volume - mn) * (255.0 / rng)).astype(np.uint8)
+
+        # Save each frame
+        for idx, frame in enumerate(frames):
             img = Image.fromarray(frame)
-            img.save(os.path.join(output_folder, f"{filename.replace('.dcm', '')}_frame{idx+1}.png"))
+            img.save(os.path.join(output_folder, f"{filename.replace('.dcm', '')}_frame{idx+1}.png"),
+                     format="PNG", compress_level=compress_level, optimize=False)
 
         print(f"✅ Processed {filename}: {pixel_array.shape[0]} frames")
 
@@ -50,5 +63,15 @@ for filename in os.listdir(input_folder):
         print(f"❌ Error processing {filename}: {e}")
 
 
+# === LOOP ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Enhanced MR DICOM files to PNG frames")
+    parser.add_argument("--fast", action="store_true", help="Use PNG compression level 1 (faster, larger files)")
+    args = parser.parse_args()
 
+    # scandir hands back names without an extra stat per entry
+    with os.scandir(input_folder) as entries:
+        filenames = [entry.name for entry in entries if entry.name.lower().endswith(".dcm")]
 
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(partial(convert_one, compress_level=1 if args.fast else 6), filenames))
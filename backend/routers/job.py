@@ -1,10 +1,11 @@
 # backend/routers/job.py
 
 from fastapi import APIRouter, HTTPException, Depends, status, Query
-from backend.database import get_db_connection
+from backend.database import get_db_connection, execute_prepared
 from backend.schemas import *
 from backend.routers.notification import create_notification
 from backend.routers.auth import get_current_user # To get the authenticated user
+from backend.routers.skill import resolve_skill_ids
 from psycopg2.extras import execute_values
 from typing import List, Optional
 
@@ -14,7 +15,7 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=JobResponse, status_code=status.HTTP_201_CREATED)
-async def create_job(
+def create_job(
     job_data: JobCreate,
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
@@ -29,18 +30,13 @@ async def create_job(
     try:
         cursor = conn.cursor()
 
-        # 1. Validate required skills
+        # 1. Validate required skills against the cached name -> id map (no query per skill)
         found_skill_ids = []
         invalid_skills = []
 
         if job_data.required_skills:
-            for skill_name in job_data.required_skills:
-                cursor.execute("SELECT id FROM skills WHERE name = %s", (skill_name,))
-                skill_row = cursor.fetchone()
-                if skill_row:
-                    found_skill_ids.append(skill_row[0])
-                else:
-                    invalid_skills.append(skill_name)
+            skill_ids_by_name, invalid_skills = resolve_skill_ids(conn, job_data.required_skills)
+            found_skill_ids = list(dict.fromkeys(skill_ids_by_name[name] for name in job_data.required_skills if name in skill_ids_by_name))
 
         if invalid_skills:
             conn.rollback()
@@ -93,7 +89,7 @@ async def create_job(
         pass # FastAPI handles connection closing via Depends
 
 @router.get("/", response_model=JobsListResponse) # <--- Change response_model here
-async def get_all_jobs(
+def get_all_jobs(
     location: Optional[str] = Query(None, description="Filter jobs by location"),
     skills: Optional[str] = Query(None, description="Comma-separated list of required skills (e.g., 'Plumbing,Electrical')"),
     min_budget: Optional[float] = Query(None, ge=0, description="Minimum budget for the job"),
@@ -120,7 +116,8 @@ async def get_all_jobs(
                 j.status,
                 j.created_at,
                 j.assigned_artisan_id,
-                ARRAY_AGG(s.name ORDER BY s.name) FILTER (WHERE s.name IS NOT NULL) AS required_skills_array
+                ARRAY_AGG(s.name ORDER BY s.name) FILTER (WHERE s.name IS NOT NULL) AS required_skills_array,
+                COUNT(*) OVER() AS total_count -- Evaluated after GROUP BY, so one per job
             FROM jobs j
             LEFT JOIN job_required_skills jrs ON j.id = jrs.job_id
             LEFT JOIN skills s ON jrs.skill_id = s.id
@@ -174,11 +171,7 @@ async def get_all_jobs(
         # -------------------------------------------------------------
         offset = (page - 1) * size
 
-        # 1. Get total count of jobs matching filters
-        cursor.execute(f"{count_query_base} {full_where_clause}", query_params)
-        total_count = cursor.fetchone()[0]
-
-        # 2. Get the jobs for the current page
+        # Get the jobs for the current page; the total rides along as a window count
         final_query = f"""
             {main_query_base}
             {full_where_clause}
@@ -192,10 +185,19 @@ async def get_all_jobs(
         cursor.execute(final_query, paged_query_params)
         job_rows = cursor.fetchall()
 
+        if job_rows:
+            total_count = job_rows[0][-1]
+        elif page > 1:
+            # Past the last page there is no row to carry the window count
+            cursor.execute(f"{count_query_base} {full_where_clause}", query_params)
+            total_count = cursor.fetchone()[0]
+        else:
+            total_count = 0
+
         jobs_list = []
         for row in job_rows:
             (job_id, client_id, title, description, location, budget,
-             status_str, created_at, assigned_artisan_id, required_skills_array) = row
+             status_str, created_at, assigned_artisan_id, required_skills_array, _total) = row
 
             status_enum = JobStatus(status_str)
             # Handle ARRAY_AGG returning {NULL} for no skills or empty array
@@ -233,11 +235,12 @@ async def get_all_jobs(
   
 
 @router.get("/{job_id}", response_model=JobResponse)
-async def get_job_by_id(job_id: int, conn = Depends(get_db_connection)):
+def get_job_by_id(job_id: int, conn = Depends(get_db_connection)):
     try:
         cursor = conn.cursor()
 
-        cursor.execute(
+        # Public, frequently hit lookup: prepared once per connection, later calls skip parse/plan
+        execute_prepared(cursor, "job_by_id",
             """
             SELECT
                 j.id,
@@ -254,8 +257,8 @@ async def get_job_by_id(job_id: int, conn = Depends(get_db_connection)):
             LEFT JOIN job_required_skills jrs ON j.id = jrs.job_id
             LEFT JOIN skills s ON jrs.skill_id = s.id
             LEFT JOIN job_reviews jr ON j.id = jr.job_id
-            WHERE j.id = %s
-            GROUP BY j.id, j.client_id, j.title, j.description, j.location, j.budget, j.status, j.created_at, jr.id;
+            WHERE j.id = $1
+            GROUP BY j.id, j.client_id, j.title, j.description, j.location, j.budget, j.status, j.created_at, jr.id
             """,
             (job_id,)
         )
@@ -291,7 +294,7 @@ async def get_job_by_id(job_id: int, conn = Depends(get_db_connection)):
         pass # FastAPI handles connection closing via Depends                      
 
 @router.put("/{job_id}", response_model=JobResponse)
-async def update_job(
+def update_job(
     job_id: int,
     job_data: JobCreate, # Expects a full update of the job
     current_user: UserBase = Depends(get_current_user),
@@ -317,18 +320,15 @@ async def update_job(
                 detail="Not authorized to update this job"
             )
 
+        requested_status = job_data.status
+
         # 3. Validate required skills (same logic as create_job)
         found_skill_ids = []
         invalid_skills = []
 
         if job_data.required_skills:
-            for skill_name in job_data.required_skills:
-                cursor.execute("SELECT id FROM skills WHERE name = %s", (skill_name,))
-                skill_row = cursor.fetchone()
-                if skill_row:
-                    found_skill_ids.append(skill_row[0])
-                else:
-                    invalid_skills.append(skill_name)
+            skill_ids_by_name, invalid_skills = resolve_skill_ids(conn, job_data.required_skills)
+            found_skill_ids = list(dict.fromkeys(skill_ids_by_name[name] for name in job_data.required_skills if name in skill_ids_by_name))
 
         if invalid_skills:
             raise HTTPException(
@@ -386,7 +386,7 @@ async def update_job(
         pass # FastAPI handles connection closing via Depends            
 
 @router.delete("/{job_id}", status_code=status.HTTP_204_NO_CONTENT) # No content on successful deletion
-async def delete_job(
+def delete_job(
     job_id: int,
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
@@ -425,7 +425,7 @@ async def delete_job(
         pass # FastAPI handles connection closing via Depends
 
 @router.post("/{job_id}/apply", response_model=JobApplicationResponse, status_code=status.HTTP_201_CREATED)
-async def apply_for_job(
+def apply_for_job(
     job_id: int,
     application_data: JobApplicationCreate,
     current_user: UserBase = Depends(get_current_user),
@@ -501,7 +501,7 @@ async def apply_for_job(
         pass # FastAPI handles connection closing via Depends
 
 @router.get("/{job_id}/applications", response_model=List[JobApplicationDetailResponse])
-async def get_applications_for_job(
+def get_applications_for_job(
     job_id: int,
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
@@ -585,7 +585,7 @@ async def get_applications_for_job(
         pass # FastAPI handles connection closing via Depends            
 
 @router.patch("/applications/{application_id}", response_model=JobApplicationDetailResponse)
-async def update_application_status(
+def update_application_status(
     application_id: int,
     status_update: ApplicationStatusUpdate,
     current_user: UserBase = Depends(get_current_user),
@@ -671,7 +671,7 @@ async def update_application_status(
             )
 
             # --- NEW NOTIFICATION CODE FOR ACCEPTED APPLICATION ---
-            await create_notification(
+            create_notification(
                 user_id=artisan_id,
                 message=f"Your application for job '{job_title}' has been accepted!",
                 notification_type=NotificationType.application_accepted,
@@ -688,7 +688,7 @@ async def update_application_status(
             # --- NEW NOTIFICATION CODE FOR REJECTED/WITHDRAWN APPLICATION ---
             # Notify the artisan only if it's explicitly rejected by client or withdrawn by artisan
             if new_app_status == JobApplicationStatus.rejected:
-                await create_notification(
+                create_notification(
                     user_id=artisan_id,
                     message=f"Your application for job '{job_title}' has been rejected.",
                     notification_type=NotificationType.application_rejected,
@@ -734,7 +734,7 @@ async def update_application_status(
         pass # FastAPI handles connection closing via Depends
 
 @router.get("/applications/me", response_model=List[ArtisanApplicationListResponse])
-async def get_my_applications(
+def get_my_applications(
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
 ):
@@ -819,7 +819,7 @@ async def get_my_applications(
         pass # FastAPI handles connection closing via Depends        
 
 @router.get("/assigned/me", response_model=List[JobResponse])
-async def get_my_assigned_jobs(
+def get_my_assigned_jobs(
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
 ):
@@ -896,7 +896,7 @@ async def get_my_assigned_jobs(
         pass # FastAPI handles connection closing via Depends
 
 @router.put("/{job_id}/complete", response_model=JobResponse)
-async def complete_job(
+def complete_job(
     job_id: int,
     current_user: UserBase = Depends(get_current_user),
     conn = Depends(get_db_connection)
@@ -954,7 +954,7 @@ async def complete_job(
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update job status.")
 
         # 6. Create notification for the assigned artisan
-        await create_notification(
+        create_notification(
             user_id=assigned_artisan_id,
             message=f"Your job '{job_title}' has been marked as complete by the client.",
             notification_type=NotificationType.job_status_update,
@@ -5,7 +5,7 @@ from backend.routers.notification import create_notification
 from fastapi import APIRouter, Depends, HTTPException, status
 from psycopg2.extras import RealDictCursor, execute_values
 
-from backend.database import get_db_connection, put_db_connection
+from backend.database import get_db_connection
 from backend.routers.auth import get_current_user
 from backend.schemas import *
 
@@ -15,13 +15,12 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
-async def create_review(
+def create_review(
     review_data: ReviewCreate,
-    current_user: UserBase = Depends(get_current_user)
+    current_user: UserBase = Depends(get_current_user),
+    conn = Depends(get_db_connection)
 ):
-    conn = None
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # 1. Authorization: Only clients can create reviews
@@ -113,7 +112,7 @@ async def create_review(
 
         # --- NEW NOTIFICATION CODE FOR NEW REVIEW ---
         # Notify the artisan that they received a new review
-        await create_notification(
+        create_notification(
             user_id=assigned_artisan_id,
             message=f"You received a new {review_data.rating}-star review for job '{job_title}'.",
             notification_type=NotificationType.new_review,
@@ -140,7 +139,7 @@ async def create_review(
         pass # FastAPI handles connection closing via Depends
 
 @router.get("/artisan/{artisan_id}", response_model=List[ReviewResponse])
-async def get_reviews_for_artisan(
+def get_reviews_for_artisan(
     artisan_id: int,
     conn = Depends(get_db_connection)
 ):
@@ -1,16 +1,119 @@
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, status
 from ..schemas import RegisterUser, LoginUser, UserProfile, UserBase, ArtisanDetails # Import your Pydantic models
-from ..database import get_db_connection, put_db_connection # Import DB utilities
+from ..database import get_db_connection, put_db_connection, execute_prepared # Import DB utilities
 from typing import List, Dict
+import threading
+import time
 
 router = APIRouter(
     prefix="/api/skills", # All routes in this router will start with /api/skills
     tags=["Skills"]       # For API documentation
 )
 
+# --- In-process skill name -> id cache ---
+# `skills` is a small, rarely-changing table, so validating skill names doesn't need a query
+# per request. The map is reloaded when older than SKILL_CACHE_TTL or after invalidate_skill_cache()
+# (called by the admin skill endpoints); a lookup miss only fetches the missing names.
+SKILL_CACHE_TTL = 300 # Seconds
+
+_skill_cache = None # Dict[str, int], replaced wholesale on reload and never mutated in place
+_skill_cache_loaded_at = 0.0
+_skill_cache_lock = threading.Lock()
+
+def get_skill_map(conn, refresh: bool = False) -> Dict[str, int]:
+    """Returns the cached skill name -> id map, reloading it if stale or if refresh=True."""
+    global _skill_cache, _skill_cache_loaded_at
+    with _skill_cache_lock:
+        if refresh or _skill_cache is None or time.monotonic() - _skill_cache_loaded_at > SKILL_CACHE_TTL:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT name, id FROM skills")
+                _skill_cache = dict(cursor.fetchall())
+            _skill_cache_loaded_at = time.monotonic()
+        return _skill_cache
+
+def resolve_skill_ids(conn, names: List[str]):
+    """
+    Maps skill names to ids using the cache.
+    Returns (ids_by_name, unknown_names). Names missing from the cache are looked up with one
+    query for just those names, and any that exist (created since the last load) are merged
+    into the cache. Unknown names never trigger a full reload.
+    """
+    global _skill_cache
+    skill_map = get_skill_map(conn)
+    missing_names = [name for name in names if name not in skill_map]
+    if missing_names:
+        # Queried outside the lock so a miss doesn't stall other handlers that need the map
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT name, id FROM skills WHERE name = ANY(%s)", (missing_names,))
+            found = dict(cursor.fetchall())
+        if found:
+            with _skill_cache_lock:
+                if _skill_cache is not None:
+                    _skill_cache = {**_skill_cache, **found} # Copy, the old map may still be in use
+            skill_map = {**skill_map, **found}
+    ids_by_name = {name: skill_map[name] for name in names if name in skill_map}
+    unknown_names = [name for name in names if name not in skill_map]
+    return ids_by_name, unknown_names
+
+def ensure_skill_ids(conn, names: List[str]) -> List[int]:
+    """
+    Like resolve_skill_ids, but creates any unknown skills instead of rejecting them.
+    Known names come from the cache; all unknown ones are inserted with a single statement.
+    Returns the ids in the order of `names`, without duplicates.
+    """
+    ids_by_name, unknown_names = resolve_skill_ids(conn, names)
+    if unknown_names:
+        # New rows come back through RETURNING; names another request created concurrently
+        # hit ON CONFLICT and are picked up by the second SELECT instead. The cache isn't
+        # touched here since the caller's transaction may still roll back, and the next
+        # lookup miss reloads it anyway.
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH ins AS (
+                    INSERT INTO skills (name) SELECT DISTINCT unnest(%s::text[])
+                    ON CONFLICT (name) DO NOTHING
+                    RETURNING name, id
+                )
+                SELECT name, id FROM ins
+                UNION ALL
+                SELECT name, id FROM skills WHERE name = ANY(%s)
+                """,
+                (unknown_names, unknown_names)
+            )
+            ids_by_name.update(cursor.fetchall())
+    return list(dict.fromkeys(ids_by_name[name] for name in names))
+
+def merge_artisan_skills(cursor, artisan_id: int, skill_ids: List[int]):
+    """
+    Makes the artisan's skills exactly `skill_ids`. Merges instead of delete-all/re-insert:
+    only skills that were dropped are deleted and only newly added ones inserted, so
+    unchanged rows aren't rewritten.
+    """
+    execute_prepared(cursor, "artisan_skills_merge",
+        """
+        WITH new_ids AS (
+            SELECT unnest($1::int[]) AS skill_id
+        ), deleted AS (
+            DELETE FROM artisan_skills
+            WHERE artisan_id = $2 AND skill_id NOT IN (SELECT skill_id FROM new_ids)
+        )
+        INSERT INTO artisan_skills (artisan_id, skill_id)
+        SELECT $2, skill_id FROM new_ids
+        ON CONFLICT (artisan_id, skill_id) DO NOTHING
+        """,
+        (skill_ids, artisan_id)
+    )
+
+def invalidate_skill_cache():
+    """Drops the cached map; the next lookup reloads it from the database."""
+    global _skill_cache
+    with _skill_cache_lock:
+        _skill_cache = None
+
 @router.get("/", response_model=List[Dict[str, int | str]]) # Example response model for skills
-async def get_all_skills(conn = Depends(get_db_connection)):
+def get_all_skills(conn = Depends(get_db_connection)):
     try:
         cursor = conn.cursor()
 
@@ -219,6 +219,7 @@ class ArtisansListResponse(BaseModel):
     total_count: int
     page: int
     size: int
+    next_cursor: Optional[str] = None # Pass back as ?cursor= to fetch the following page
 
     class Config:
         from_attributes = True